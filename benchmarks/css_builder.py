@@ -0,0 +1,104 @@
+"""
+Micro-benchmark comparing the in-place `CssStyle` builder against the previous implementation,
+which deep-copied the whole style on every merge.
+
+The workload is the alias table that `seqsee-jsonmaker` writes into every chart it generates: we
+build the header CSS with `Header.css()`, and the inline style of every attribute list that appears
+in `csv/Adams-motivic-E2-machine.csv`.
+
+Usage: python benchmarks/css_builder.py [--repeat N]
+"""
+
+import argparse
+import copy
+import timeit
+from unittest import mock
+
+import seqsee.css
+from seqsee.chart_internals import Attribute, Header
+from seqsee.css import CssStyle, style_and_aliases_from_attributes
+from seqsee.jsonmaker import aliases
+
+
+class LegacyCssStyle(CssStyle):
+    """The `CssStyle` implementation from SeqSee 0.3.1, where every merge copies everything."""
+
+    def append(self, other):
+        self._styles = self.__add__(other)._styles
+
+    def __iadd__(self, other):
+        # The legacy class had no in-place addition, so `+=` went through `__add__`
+        return self.__add__(other)
+
+    def __add__(self, other):
+        summed = copy.deepcopy(self)
+        if isinstance(other, str):
+            single = other.split(":")
+            summed._styles[single[0]] = single[1]
+        elif isinstance(other, dict):
+            summed._styles.update(other)
+        elif isinstance(other, CssStyle):
+            summed._styles.update(other._styles)
+        else:
+            raise TypeError("Bad type for style")
+        return summed
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+
+# Attribute lists found on the nodes and edges of the machine-generated charts
+element_attributes = [
+    [],
+    ["tau1"],
+    ["tau2"],
+    ["tau4plus"],
+    ["dr"],
+    ["tau1", "n2"],
+    ["h1tower"],
+    [Attribute(arrowTip="simple")],
+    ["tau2", Attribute(arrowTip="simple"), "hh0"],
+]
+
+
+def build_header_css():
+    Header(aliases=aliases).css().generate()
+
+
+def build_inline_styles():
+    for attributes in element_attributes:
+        style, _ = style_and_aliases_from_attributes(attributes)
+        style.generate(indent=0)
+
+
+def run(name, repeat):
+    header_time = min(timeit.repeat(build_header_css, number=repeat, repeat=5))
+    inline_time = min(timeit.repeat(build_inline_styles, number=repeat, repeat=5))
+    print(
+        f"{name:>8}: Header.css() {1e6 * header_time / repeat:8.1f} us, "
+        f"inline styles {1e6 * inline_time / repeat:8.1f} us"
+    )
+    return header_time, inline_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    # Make sure both implementations produce the same CSS before timing them
+    current_css = Header(aliases=aliases).css().generate()
+    with mock.patch.object(seqsee.css, "CssStyle", LegacyCssStyle):
+        legacy_css = Header(aliases=aliases).css().generate()
+        assert legacy_css == current_css, "Legacy and current CSS differ"
+        legacy = run("legacy", args.repeat)
+    current = run("current", args.repeat)
+
+    print(
+        f" speedup: Header.css() {legacy[0] / current[0]:.1f}x, "
+        f"inline styles {legacy[1] / current[1]:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Check and benchmark the token-by-token label transformer of `seqsee-jsonmaker` against the
+reference chain of regular expression substitutions.
+
+Every node name found in `csv/` is checked, together with random names built from the characters
+that the substitutions care about. The script exits with a non-zero status if any label differs.
+
+Usage: python benchmarks/labels.py [--fuzz N] [--repeat N]
+"""
+
+import argparse
+import glob
+import random
+import sys
+import timeit
+
+import pandas as pd  # type: ignore
+
+from seqsee.jsonmaker import (
+    apply_substitutions,
+    deduplicate_names,
+    label_from_node_name,
+    transform_label,
+    transform_token,
+)
+
+# Characters that appear in the CSV files, or in the patterns and replacements of the substitutions
+fuzz_alphabet = "_.Dt{}^,01234 56789 hPvxMa\\-'+[]()"
+
+
+def csv_names():
+    names = []
+    for csv_file in sorted(glob.glob("csv/*.csv")):
+        node_names, _ = deduplicate_names(pd.read_csv(csv_file))
+        names.extend(node_names)
+    return names
+
+
+def fuzz_names(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choices(fuzz_alphabet, k=rng.randint(0, 12))) for _ in range(count)
+    ]
+
+
+def check(names, label):
+    mismatches = [
+        name for name in names if transform_label(name) != apply_substitutions(name)
+    ]
+    for name in mismatches[:10]:
+        print(f"  {name!r}: {transform_label(name)!r} != {apply_substitutions(name)!r}")
+    print(f"{label}: {len(names) - len(mismatches)}/{len(names)} identical")
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    names = csv_names()
+    ok = check(names, "csv names")
+    ok &= check(fuzz_names(args.fuzz), "fuzzed names")
+
+    def reference():
+        for name in names:
+            apply_substitutions(name)
+
+    def cold():
+        transform_token.cache_clear()
+        for name in names:
+            transform_label(name)
+
+    def warm():
+        for name in names:
+            label_from_node_name(name)
+
+    for label, fn in [
+        ("reference", reference),
+        ("by token", cold),
+        ("memoized", warm),
+    ]:
+        elapsed = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f"{label:>12}: {1e6 * elapsed / len(names):6.2f} us per name")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Benchmark every stage of the SeqSee pipeline and compare the results against a stored baseline.
+
+The stages are `csv` (`process_csv`), `load` (parsing the JSON and building the `Collection`),
+`prepare` (`Chart.prepare` on every chart) and `render` (`Collection.generate_html_chunks`). They
+run over the bundled datasets in `csv/` and `json/`, and over synthetic machine-generated charts
+with the requested numbers of nodes, which go through the whole pipeline from CSV to HTML. The
+synthetic charts are also converted with `stream_csv`, in the `stream` stage. The
+`startup` dataset runs `seqsee` on `json/trivial.json` in a fresh interpreter, which is dominated by
+the cost of starting up.
+
+Each stage is timed on its own (best of `--repeat` runs), then the whole pipeline runs once more
+under `tracemalloc` to measure the peak memory of every stage. The results are compared against
+`benchmarks/baseline.json`, and the script exits with a non-zero status if a stage got slower or
+uses more memory than the tolerances allow. Datasets with a stage that got slower are timed again
+at the end, and the best time of both rounds counts. Timings are only comparable on the same
+machine, so regenerate the baseline with `--update-baseline` before comparing a change against it.
+
+Usage: python benchmarks/pipeline.py [--only PATTERN] [--sizes N ...] [--update-baseline]
+"""
+
+import argparse
+import contextlib
+import fnmatch
+import glob
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from seqsee.decoding import load_json
+from seqsee.jsonmaker import process_csv, stream_csv
+from seqsee.main import Collection
+
+default_baseline = os.path.join(os.path.dirname(__file__), "baseline.json")
+default_sizes = [10_000, 100_000]
+# Smallest differences reported as regressions. Conversions of the small bundled CSV files take
+# anywhere between 0.2 and 0.4 seconds from one run to the next, so even the best of several runs
+# moves by a few hundredths of a second.
+min_seconds = 0.1
+min_bytes = 2**20
+
+# Multiplication generators, and the offset of the node each of them points to
+generator_offsets = {"h0": (0, 1), "h1": (1, 1), "h2": (3, 1)}
+
+
+def synthetic_csv(path, node_count, seed=0):
+    """
+    Write a CSV file in the format of the machine-generated charts, with `node_count` nodes.
+
+    The nodes fill a triangle of bidegrees with up to three nodes each, and every node multiplies
+    into some of the nodes above it, like in a real Adams chart.
+    """
+    rng = random.Random(seed)
+
+    # Add stems to the triangle until it holds `node_count` nodes
+    grid = {}
+    count = 0
+    stem = 0
+    while count < node_count:
+        for filtration in range(stem // 2 + 1):
+            for _ in range(rng.randint(1, 3)):
+                if count == node_count:
+                    break
+                grid.setdefault((stem, filtration), []).append(
+                    f"{{{filtration}-{count}}}"
+                )
+                count += 1
+        stem += 1
+
+    columns = ["name", "stem", "Adams filtration", "weight", "tautorsion"]
+    for generator in generator_offsets:
+        columns += [f"{generator}info", f"{generator}target"]
+
+    with open(path, "w") as f:
+        f.write(",".join(columns) + "\n")
+        for (stem, filtration), names in grid.items():
+            for name in names:
+                row = [
+                    name,
+                    stem,
+                    filtration,
+                    rng.randint(0, stem),
+                    rng.choice("00012"),
+                ]
+                for dx, dy in generator_offsets.values():
+                    targets = grid.get((stem + dx, filtration + dy), [])
+                    if targets and rng.random() < 0.6:
+                        info = rng.choice(["", "", "", "1", "3"])
+                        row += [info, rng.choice(targets)]
+                    else:
+                        row += ["", ""]
+                f.write(",".join(str(value) for value in row) + "\n")
+
+
+def json_stages(input_file, trust_input):
+    """Return the stages that turn a JSON file into HTML, as functions of the previous result."""
+
+    def load(_):
+        spec = load_json(input_file)
+        return Collection(spec, input_file=input_file, trust_input=trust_input)
+
+    def prepare(collection):
+        for chart in collection:
+            chart.prepare()
+        return collection
+
+    def render(collection):
+        with open(os.devnull, "w") as f:
+            f.writelines(collection.generate_html_chunks())
+
+    return [("load", load), ("prepare", prepare), ("render", render)]
+
+
+def startup_stages(input_file, work_dir, trust_input):
+    """Return a stage that converts a JSON file with `seqsee` in a fresh interpreter."""
+    output_file = os.path.join(work_dir, "startup.html")
+    command = [sys.executable, "-m", "seqsee.main", input_file, output_file]
+    if trust_input:
+        command.append("--trust-input")
+
+    def cold_start(_):
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+
+    return [("cold", cold_start)]
+
+
+def pipelines(args, work_dir):
+    """Yield the name of each dataset, and the list of stages to run on it."""
+    datasets = []
+    for csv_file in sorted(glob.glob("csv/*.csv")):
+        output_file = os.path.join(work_dir, os.path.basename(csv_file) + ".json")
+        datasets.append((csv_file, [("csv", csv_stage(csv_file, output_file))]))
+    for json_file in sorted(glob.glob("json/*.json")):
+        datasets.append((json_file, json_stages(json_file, args.trust_input)))
+    datasets.append(
+        ("startup", startup_stages("json/trivial.json", work_dir, args.trust_input))
+    )
+    for size in args.sizes:
+        csv_file = os.path.join(work_dir, f"synthetic-{size}.csv")
+        json_file = os.path.join(work_dir, f"synthetic-{size}.json")
+        stream_file = os.path.join(work_dir, f"synthetic-{size}-stream.json")
+        stages = [
+            ("csv", csv_stage(csv_file, json_file)),
+            ("stream", csv_stage(csv_file, stream_file, stream_csv)),
+        ]
+        stages += json_stages(json_file, args.trust_input)
+        datasets.append((f"synthetic-{size}", stages, csv_file, size))
+
+    for name, stages, *synthetic in datasets:
+        if args.only and not any(fnmatch.fnmatch(name, p) for p in args.only):
+            continue
+        if synthetic:
+            synthetic_csv(*synthetic)
+        yield name, stages
+
+
+def csv_stage(input_file, output_file, convert_csv=process_csv):
+    def convert(_):
+        convert_csv(input_file, output_file)
+
+    return convert
+
+
+def run_stages(stages, trace_memory=False):
+    """Run the stages one after the other, and return the time and peak memory of each one."""
+    results = {}
+    value = None
+    for stage, fn in stages:
+        if trace_memory:
+            tracemalloc.reset_peak()
+            start_memory, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        value = fn(value)
+        elapsed = time.perf_counter() - start
+        results[stage] = {"seconds": elapsed}
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            results[stage]["peak_bytes"] = peak - start_memory
+    return results
+
+
+def time_stages(stages, repeat):
+    """Return the best time of every stage over `repeat` runs."""
+    # The conversions print progress messages, which we don't want in the middle of our report
+    with contextlib.redirect_stdout(io.StringIO()):
+        timings = [run_stages(stages) for _ in range(repeat)]
+    return {
+        stage: min(timing[stage]["seconds"] for timing in timings)
+        for stage, _ in stages
+    }
+
+
+def benchmark(stages, repeat):
+    seconds = time_stages(stages, repeat)
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        try:
+            memory = run_stages(stages, trace_memory=True)
+        finally:
+            tracemalloc.stop()
+
+    return {
+        stage: {"seconds": seconds[stage], "peak_bytes": memory[stage]["peak_bytes"]}
+        for stage, _ in stages
+    }
+
+
+def is_slower(result, base, tolerance):
+    # Tiny stages are dominated by noise, so only report differences above an absolute threshold
+    slower = result["seconds"] - base["seconds"]
+    return slower > min_seconds and slower > tolerance * base["seconds"]
+
+
+def is_regression(result, base, tolerance, memory_tolerance):
+    bigger = result["peak_bytes"] - base["peak_bytes"]
+    return is_slower(result, base, tolerance) or (
+        bigger > min_bytes and bigger > memory_tolerance * base["peak_bytes"]
+    )
+
+
+def compare(results, baseline, tolerance, memory_tolerance):
+    """Print the results next to the baseline. Returns the number of regressions."""
+    regressions = 0
+    for dataset, stages in results.items():
+        for stage, result in stages.items():
+            seconds = result["seconds"]
+            mebibytes = result["peak_bytes"] / 2**20
+            base = baseline.get(dataset, {}).get(stage)
+            if base is None:
+                print(
+                    f"{dataset:<40} {stage:<8} {seconds:>9.3f} {'-':>8} {mebibytes:>10.1f}"
+                )
+                continue
+
+            time_ratio = seconds / max(base["seconds"], 1e-9)
+            memory_ratio = result["peak_bytes"] / max(base["peak_bytes"], 1)
+            line = (
+                f"{dataset:<40} {stage:<8} {seconds:>9.3f} {time_ratio:>7.2f}x"
+                f" {mebibytes:>10.1f} {memory_ratio:>7.2f}x"
+            )
+            if is_regression(result, base, tolerance, memory_tolerance):
+                line += "  REGRESSION"
+                regressions += 1
+            print(line, flush=True)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        metavar="PATTERN",
+        help="only run the datasets matching one of these patterns, e.g. 'json/*' or 'synthetic-*'",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="*",
+        type=int,
+        default=default_sizes,
+        help="numbers of nodes of the synthetic charts (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="number of timed runs of each stage, of which the best one counts. A single run is "
+        "too noisy for the time tolerance (default: %(default)s)",
+    )
+    parser.add_argument("--trust-input", action="store_true")
+    parser.add_argument("--baseline", default=default_baseline)
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the results as the new baseline instead of comparing against it",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="relative slowdown allowed before reporting a regression (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=0.1,
+        help="relative increase of peak memory allowed (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--output", metavar="FILE", help="also write the results to FILE"
+    )
+    args = parser.parse_args()
+
+    baseline = {}
+    if not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    regressions = {}
+    slower = []
+    print(
+        f"{'dataset':<40} {'stage':<8} {'time (s)':>9} {'vs base':>8}"
+        f" {'peak (MiB)':>10} {'vs base':>8}"
+    )
+    with tempfile.TemporaryDirectory() as work_dir:
+        for dataset, stages in pipelines(args, work_dir):
+            results[dataset] = benchmark(stages, args.repeat)
+            regressions[dataset] = compare(
+                {dataset: results[dataset]},
+                baseline,
+                args.tolerance,
+                args.memory_tolerance,
+            )
+            base = baseline.get(dataset, {})
+            if any(
+                is_slower(result, base[stage], args.tolerance)
+                for stage, result in results[dataset].items()
+                if stage in base
+            ):
+                slower.append((dataset, stages))
+
+        # The speed of a shared machine drifts for tens of seconds at a time, so a stage that got
+        # slower is timed again at the end, and only counts as a regression if it still is
+        if slower:
+            print("Timing the datasets that got slower again:")
+        for dataset, stages in slower:
+            seconds = time_stages(stages, args.repeat)
+            for stage, result in results[dataset].items():
+                result["seconds"] = min(result["seconds"], seconds[stage])
+            regressions[dataset] = compare(
+                {dataset: results[dataset]},
+                baseline,
+                args.tolerance,
+                args.memory_tolerance,
+            )
+
+    report = {
+        "machine": platform.platform(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    for path in [args.baseline if args.update_baseline else None, args.output]:
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
+
+    regression_count = sum(regressions.values())
+    if regression_count:
+        print(f"{regression_count} stages regressed compared to {args.baseline}")
+    sys.exit(1 if regression_count else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
-import copy
 import pydantic
-from typing import Dict, Iterator, List, Literal, Optional, Union
+from pydantic_core import core_schema
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Tuple, Union
+
+# pydantic only supports `typing.TypedDict` from Python 3.12 onwards
+from typing_extensions import Required, TypedDict
 
 
 class DimensionRange(pydantic.BaseModel):
@@ -71,12 +74,50 @@ class ChartConfig(pydantic.BaseModel):
     nodeSize: float = 0.04
     nodeSpacing: float = 0.02
     nodeSlope: Optional[float] = 0.0
+    renderer: Literal["svg", "canvas"] = "svg"
 
     model_config = pydantic.ConfigDict(extra="forbid")
 
 
 Attributes = List[Union[str, Attribute]]
 
+# A hashable canonical form of an attribute list. Aliases are kept as strings and raw attribute
+# objects are replaced by the tuple of their (key, value) pairs, in the order that they are applied.
+AttributesKey = Tuple[Union[str, Tuple[Tuple[str, Union[str, float]], ...]], ...]
+
+
+def attributes_key(attributes: Attributes) -> AttributesKey:
+    """Return a hashable canonical form of an attribute list, suitable for use as a cache key."""
+    return tuple(
+        attr if isinstance(attr, str) else tuple(attr.items()) for attr in attributes
+    )
+
+
+# Every distinct attribute list used by a node or an edge, and the index of each one in that list.
+# Charts reuse a handful of attribute lists across thousands of elements, which then only need to
+# store an index. The empty list always has id 0.
+_interned_attributes: List[Attributes] = [[]]
+_attribute_ids: Dict[AttributesKey, int] = {(): 0}
+
+
+def intern_attributes(attributes: Optional[Attributes]) -> int:
+    """Return the id of an attribute list, adding it to the table of interned lists if needed."""
+    if not attributes:
+        # This is by far the most common case, so we don't even bother building the key
+        return 0
+    key = attributes_key(attributes)
+    attributes_id = _attribute_ids.get(key)
+    if attributes_id is None:
+        attributes_id = len(_interned_attributes)
+        _interned_attributes.append(list(attributes))
+        _attribute_ids[key] = attributes_id
+    return attributes_id
+
+
+def interned_attributes(attributes_id: int) -> Attributes:
+    """Return the attribute list with a given id. The list is shared, so it must not be modified."""
+    return _interned_attributes[attributes_id]
+
 
 class GlobalAttributes(pydantic.BaseModel):
     grid: Attributes = [Attribute(color="#ccc", thickness=0.01)]
@@ -155,7 +196,9 @@ class Header(pydantic.BaseModel):
         for alias_name, attributes_list in attribute_aliases.items():
             style, aliases = style_and_aliases_from_attributes(attributes_list)
 
-            style = copy.deepcopy(style)
+            # Take a snapshot so that merging the referenced aliases below can never leak into a
+            # style that is shared with someone else.
+            style = style.copy()
             for alias in aliases:
                 style.append(chart_css[css_class_name(alias)])
 
@@ -169,16 +212,150 @@ class Header(pydantic.BaseModel):
         return chart_css
 
 
-class Node(pydantic.BaseModel):
-    x: Optional[int] = None
-    y: Optional[int] = None
-    absoluteX: Optional[float] = None
-    absoluteY: Optional[float] = None
-    position: int = 0
-    label: str = ""
-    attributes: Attributes = []
+class NodeSpec(TypedDict, total=False):
+    """The input format of a node. This is what pydantic validates when a chart is built."""
 
-    model_config = pydantic.ConfigDict(extra="forbid")
+    __pydantic_config__ = pydantic.ConfigDict(extra="forbid")  # type: ignore
+
+    x: Optional[int]
+    y: Optional[int]
+    absoluteX: Optional[float]
+    absoluteY: Optional[float]
+    position: int
+    label: str
+    attributes: Attributes
+
+
+class EdgeSpec(TypedDict, total=False):
+    """The input format of an edge. This is what pydantic validates when a chart is built."""
+
+    __pydantic_config__ = pydantic.ConfigDict(  # type: ignore
+        extra="forbid",
+        json_schema_extra={
+            "oneOf": [{"required": ["target"]}, {"required": ["offset"]}]
+        },
+    )
+
+    source: Required[str]
+    target: Optional[str]
+    offset: Optional[Point]
+    label: str
+    bezier: List[Point]
+    attributes: Attributes
+
+
+class ChartElement:
+    """
+    Base class for the nodes and edges of a chart.
+
+    Machine-generated charts have tens of thousands of elements, so they are plain records with
+    `__slots__` instead of pydantic models. Their input is validated once, as a `spec` typed dict,
+    when the chart is built, and their attribute lists are interned with `intern_attributes`.
+    """
+
+    __slots__ = ()
+    spec: type
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler):
+        return core_schema.no_info_after_validator_function(
+            lambda spec: cls(**spec),
+            handler.generate_schema(cls.spec),
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda element: element.to_spec()
+            ),
+        )
+
+    @property
+    def attributes(self) -> Attributes:
+        return list(interned_attributes(self.attributes_id))
+
+    @attributes.setter
+    def attributes(self, attributes: Attributes) -> None:
+        self.attributes_id = intern_attributes(attributes)
+
+    def to_spec(self) -> dict:
+        """Return the fields of the element, in the same format as its input."""
+        return {field: getattr(self, field) for field in self.spec.__annotations__}
+
+    def __getstate__(self):
+        # Attribute ids are only meaningful in the process that interned them, so we pickle the
+        # attribute lists themselves
+        return self.to_spec()
+
+    def __setstate__(self, state) -> None:
+        self.__init__(**state)
+
+    def __eq__(self, other) -> bool:
+        if type(self) is not type(other):
+            return NotImplemented
+        return self.to_spec() == other.to_spec()
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{key}={value!r}" for key, value in self.to_spec().items())
+        return f"{type(self).__name__}({fields})"
+
+
+def compact_interned_attributes(elements: Iterable[ChartElement]) -> None:
+    """
+    Forget the interned attribute lists that none of `elements` use, and renumber the others.
+
+    The table of interned lists only ever grows, which is fine for a single run, but not for a
+    process that keeps rebuilding charts as they are edited. The given elements must be the only
+    ones still in use, each given once, since the ids of every other element become invalid.
+    """
+    from seqsee.css import interned_style_and_classes
+
+    new_ids = {0: 0}
+    kept: List[Attributes] = [[]]
+    for element in elements:
+        new_id = new_ids.get(element.attributes_id)
+        if new_id is None:
+            new_id = new_ids[element.attributes_id] = len(kept)
+            kept.append(_interned_attributes[element.attributes_id])
+        element.attributes_id = new_id
+
+    _interned_attributes[:] = kept
+    _attribute_ids.clear()
+    _attribute_ids.update(
+        (attributes_key(attributes), attributes_id)
+        for attributes_id, attributes in enumerate(kept)
+    )
+    # The styles are memoized by id
+    interned_style_and_classes.cache_clear()
+
+
+class Node(ChartElement):
+    __slots__ = (
+        "x",
+        "y",
+        "absoluteX",
+        "absoluteY",
+        "position",
+        "label",
+        "attributes_id",
+    )
+    spec = NodeSpec
+
+    def __init__(
+        self,
+        x: Optional[int] = None,
+        y: Optional[int] = None,
+        absoluteX: Optional[float] = None,
+        absoluteY: Optional[float] = None,
+        position: int = 0,
+        label: str = "",
+        attributes: Optional[Attributes] = None,
+    ):
+        self.x = x
+        self.y = y
+        self.absoluteX = absoluteX
+        self.absoluteY = absoluteY
+        self.position = position
+        self.label = label
+        self.attributes_id = intern_attributes(attributes)
 
     def x_coord(self) -> float:
         if self.x is not None:
@@ -199,7 +376,7 @@ class Node(pydantic.BaseModel):
             raise NotImplementedError
 
     def svg(self, scale: float) -> str:
-        from seqsee.css import style_and_aliases_from_attributes
+        from seqsee.css import interned_style_and_classes
 
         assert self.absoluteX is not None
         assert self.absoluteY is not None
@@ -207,38 +384,57 @@ class Node(pydantic.BaseModel):
         cx = self.absoluteX * scale
         cy = self.absoluteY * scale
 
-        style, aliases = style_and_aliases_from_attributes(self.attributes)
-        style = style.generate(indent=0).replace("\n", " ").strip(" {}")
+        style, aliases = interned_style_and_classes(self.attributes_id)
         if style:
             style = f' style="{style}"'
-        aliases = " ".join(aliases)
 
         label = self.label
 
         return f'<circle class="defaultNode {aliases}" cx="{cx}" cy="{cy}"{style} data-label="{label}"></circle>'
 
 
-class Edge(pydantic.BaseModel):
-    source: str
-    target: Optional[str] = None
-    offset: Optional[Point] = None
-    label: str = ""
-    bezier: List[Point] = []
-    attributes: Attributes = []
-
-    _concrete_source: Optional[Node] = None
-    _concrete_target: Optional[Node] = None
-
-    model_config = pydantic.ConfigDict(
-        extra="forbid",
-        json_schema_extra={
-            "oneOf": [{"required": ["target"]}, {"required": ["offset"]}]
-        },
+class Edge(ChartElement):
+    __slots__ = (
+        "source",
+        "target",
+        "offset",
+        "label",
+        "bezier",
+        "attributes_id",
+        "_concrete_source",
+        "_concrete_target",
     )
-
-    def svg(self, scale: float) -> str:
-        from seqsee.css import style_and_aliases_from_attributes
-
+    spec = EdgeSpec
+
+    def __init__(
+        self,
+        source: str,
+        target: Optional[str] = None,
+        offset: Optional[Point] = None,
+        label: str = "",
+        bezier: Optional[List[Point]] = None,
+        attributes: Optional[Attributes] = None,
+    ):
+        self.source = source
+        self.target = target
+        self.offset = offset
+        self.label = label
+        self.bezier = [] if bezier is None else bezier
+        self.attributes_id = intern_attributes(attributes)
+        self._concrete_source: Optional[Node] = None
+        self._concrete_target: Optional[Node] = None
+
+    def __getstate__(self):
+        return (self.to_spec(), self._concrete_source, self._concrete_target)
+
+    def __setstate__(self, state) -> None:
+        spec, concrete_source, concrete_target = state
+        self.__init__(**spec)
+        self._concrete_source = concrete_source
+        self._concrete_target = concrete_target
+
+    def endpoints(self, scale: float) -> Tuple[float, float, float, float]:
+        """Return the coordinates of the source and the target of the edge, scaled to pixels."""
         assert self._concrete_source is not None
         source = self._concrete_source
         assert source.absoluteX is not None
@@ -261,29 +457,54 @@ class Edge(pydantic.BaseModel):
 
         x1 = source.absoluteX * scale
         y1 = source.absoluteY * scale
+        return (x1, y1, target_x, target_y)
+
+    def control_points(self, scale: float) -> List[Tuple[float, float]]:
+        """
+        Return the control points of the Bézier curve of the edge, scaled to pixels. This is empty
+        if the edge is a straight line.
+        """
+        if len(self.bezier) == 0:
+            return []
+
+        x1, y1, target_x, target_y = self.endpoints(scale)
+        control_points = self.bezier
+        if len(control_points) == 1:
+            control_x = control_points[0].x * scale + x1
+            control_y = control_points[0].y * scale + y1
+            return [(control_x, control_y)]
+        elif len(control_points) == 2:
+            control0_x = control_points[0].x * scale + x1
+            control0_y = control_points[0].y * scale + y1
+            control1_x = control_points[1].x * scale + target_x
+            control1_y = control_points[1].y * scale + target_y
+            return [(control0_x, control0_y), (control1_x, control1_y)]
+        else:
+            # Impossible due to schema
+            raise NotImplementedError
+
+    def path_data(self, scale: float) -> str:
+        """Return the `d` attribute of the SVG path of a curved edge."""
+        x1, y1, target_x, target_y = self.endpoints(scale)
+        control_points = self.control_points(scale)
+        if len(control_points) == 1:
+            [(control_x, control_y)] = control_points
+            curve_d = f"Q {control_x} {control_y} {target_x} {target_y}"
+        else:
+            [(control0_x, control0_y), (control1_x, control1_y)] = control_points
+            curve_d = f"C {control0_x} {control0_y} {control1_x} {control1_y} {target_x} {target_y}"
+        return f"M {x1} {y1} {curve_d}"
+
+    def svg(self, scale: float) -> str:
+        from seqsee.css import interned_style_and_classes
 
-        attributes = self.attributes
-        style, aliases = style_and_aliases_from_attributes(attributes)
-        style = style.generate(indent=0).replace("\n", " ").strip(" {}")
-        classes = "defaultEdge " + " ".join(aliases)
+        style, aliases = interned_style_and_classes(self.attributes_id)
+        classes = "defaultEdge " + aliases
 
         if len(self.bezier) > 0:
-            control_points = self.bezier
-            if len(control_points) == 1:
-                control_x = control_points[0].x * scale + x1
-                control_y = control_points[0].y * scale + y1
-                curve_d = f"Q {control_x} {control_y} {target_x} {target_y}"
-            elif len(control_points) == 2:
-                control0_x = control_points[0].x * scale + x1
-                control0_y = control_points[0].y * scale + y1
-                control1_x = control_points[1].x * scale + target_x
-                control1_y = control_points[1].y * scale + target_y
-                curve_d = f"C {control0_x} {control0_y} {control1_x} {control1_y} {target_x} {target_y}"
-            else:
-                # Impossible due to schema
-                raise NotImplementedError
-            edge_svg = f'<path d="M {x1} {y1} {curve_d}" class="{classes}" style="fill: none;{style}"></path>'
+            edge_svg = f'<path d="{self.path_data(scale)}" class="{classes}" style="fill: none;{style}"></path>'
         else:
+            x1, y1, target_x, target_y = self.endpoints(scale)
             if style:
                 style = f' style="{style}"'
             edge_svg = f'<line x1="{x1}" y1="{y1}" x2="{target_x}" y2="{target_y}" class="{classes}"{style}></line>'
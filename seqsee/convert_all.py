@@ -1,20 +1,358 @@
+import argparse
+import contextlib
+import hashlib
+import json
 import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from importlib.resources import files
+from typing import Dict, List, Optional, Set, Tuple
+from .decoding import load_json
 from .jsonmaker import process_csv
 from .main import process_json
+from .profiling import add_profiling_arguments, phase, profiler, profiling
 
+# Package files whose contents affect the output of each stage. If any of them changes, every output
+# of that stage is rebuilt.
+csv_stage_resources = ["jsonmaker.py", "input_schema.json"]
+json_stage_resources = [
+    "main.py",
+    "chart_internals.py",
+    "css.py",
+    "decoding.py",
+    "deltas.py",
+    "tiles.py",
+    "input_schema.json",
+    "template.html.jinja",
+    "chart.html.jinja",
+]
+
+default_manifest_file = ".seqsee-build.json"
+
+# Name of the profiling phase of each kind of conversion
+task_phases = {"csv": "csv to json", "json": "json to html"}
+
+
+def file_hash(path) -> Optional[str]:
+    """Return the SHA-256 digest of a file, or `None` if it doesn't exist."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def resource_hashes(resources: List[str]) -> Dict[str, Optional[str]]:
+    """Return the SHA-256 digests of files shipped with the package."""
+    src_dir = files("seqsee")
+    return {
+        f"seqsee/{name}": hashlib.sha256((src_dir / name).read_bytes()).hexdigest()
+        for name in resources
+    }
+
+
+class BuildManifest:
+    """
+    Record of the content hashes of the inputs and outputs of every stage of a previous build.
+
+    A stage is up to date if all of its inputs have the same hashes as when its output was last
+    built, and if the output itself hasn't been modified or deleted since.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, "r") as f:
+                self.entries: Dict[str, dict] = json.load(f)["outputs"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            self.entries = {}
+
+    def is_up_to_date(self, output: str, inputs: Dict[str, Optional[str]]) -> bool:
+        entry = self.entries.get(output)
+        if entry is None or entry["inputs"] != inputs:
+            return False
+        return entry["output"] == file_hash(output)
+
+    def record(self, output: str, inputs: Dict[str, Optional[str]], **extra) -> None:
+        if (output_hash := file_hash(output)) is None:
+            # The stage failed to produce an output, so there's nothing to remember
+            self.entries.pop(output, None)
+            return
+        self.entries[output] = {"inputs": inputs, "output": output_hash, **extra}
+
+    def forget(self, output: str) -> None:
+        """Drop the record of an output, so that the next build runs its stage again."""
+        self.entries.pop(output, None)
+
+    def chart_dependencies(self, json_file: str, json_hash: Optional[str]) -> List[str]:
+        """
+        Return the paths of the chart files that a JSON file references in its `charts` section.
+
+        The references from the previous build are reused if the JSON file hasn't changed, so we
+        only need to parse the files that were modified. The paths are normalized, so that a
+        reference like `../json/x.json` matches the task producing `json/x.json`.
+        """
+        for entry in self.entries.values():
+            if (
+                entry.get("source") == json_file
+                and entry["inputs"][json_file] == json_hash
+            ):
+                return [os.path.normpath(chart) for chart in entry["dependencies"]]
+
+        spec = load_json(json_file)
+        charts = spec.get("charts", []) if isinstance(spec, dict) else []
+        parent = os.path.dirname(json_file)
+        return [
+            os.path.normpath(os.path.join(parent, chart))
+            for chart in charts
+            if isinstance(chart, str)
+        ]
+
+    def save(self) -> None:
+        partial_file = f"{self.path}.partial"
+        with open(partial_file, "w") as f:
+            json.dump({"outputs": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(partial_file, self.path)
+
+
+class BuildTask:
+    """
+    A node of the build graph: converting `input_file` to `output_file`, either from CSV to JSON or
+    from JSON to HTML. The task can only run once the tasks producing its `dependencies` are done.
+    """
+
+    def __init__(self, kind: str, input_file: str, output_file: str):
+        self.kind = kind
+        self.input_file = input_file
+        self.output_file = output_file
+        self.chart_refs: List[str] = []
+        self.dependencies: Set[str] = set()
+        self.dependents: List["BuildTask"] = []
+
+    def inputs(self, manifest: BuildManifest) -> Dict[str, Optional[str]]:
+        """Return the hashes of every input of the task. Only valid once dependencies are done."""
+        input_hash = file_hash(self.input_file)
+        if self.kind == "csv":
+            return {self.input_file: input_hash, **resource_hashes(csv_stage_resources)}
+
+        self.chart_refs = manifest.chart_dependencies(self.input_file, input_hash)
+        return {
+            self.input_file: input_hash,
+            **{chart_ref: file_hash(chart_ref) for chart_ref in self.chart_refs},
+            **resource_hashes(json_stage_resources),
+        }
+
+
+def run_task(
+    kind: str, input_file: str, output_file: str, profile: bool = False
+) -> Tuple[float, bool, Optional[dict]]:
+    """
+    Run a single conversion and return its wall time, and whether it wrote its output. This runs in
+    worker processes.
+
+    If `profile` is set, the conversion is profiled on its own and its report is returned as well,
+    so that the parent process can merge the reports of all workers.
+    """
+    if profile:
+        profiler.enabled = True
+        profiler.stats = {}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    start = time.perf_counter()
+    with phase(task_phases[kind]):
+        if kind == "csv":
+            written = process_csv(input_file, output_file)
+        else:
+            # A failed HTML conversion raises instead
+            process_json(input_file, output_file)
+            written = True
+    elapsed = time.perf_counter() - start
+    return (elapsed, written, profiler.report() if profile else None)
+
+
+def run_task_inline(kind: str, input_file: str, output_file: str) -> Future:
+    """
+    Run a single conversion in the current process, and wrap its outcome in a completed future.
+    This is used when there is a single job, so that the whole build can be profiled at once.
+    """
+    future: Future = Future()
+    try:
+        future.set_result(run_task(kind, input_file, output_file))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def build_graph(manifest: BuildManifest) -> List[BuildTask]:
+    """
+    Collect the conversions to run, and link each of them to the conversions producing its inputs.
+
+    This gives the graph CSV -> page JSON -> collection JSON -> HTML, where the HTML of a collection
+    depends on the conversions of every page that it references.
+    """
+    tasks: Dict[str, BuildTask] = {}
 
-def main():
     # Run process_csv on all files in the csv directory in the poetry project root
-    for csv_filename in os.listdir("csv"):
+    for csv_filename in sorted(os.listdir("csv")):
         if csv_filename.endswith(".csv"):
             json_filename = csv_filename.replace(".csv", ".json")
-            process_csv("csv/" + csv_filename, "json/" + json_filename)
+            task = BuildTask("csv", "csv/" + csv_filename, "json/" + json_filename)
+            tasks[task.output_file] = task
+
+    # Then process all the json files in the json directory, including the ones we are about to
+    # generate
+    json_files = {task.output_file for task in tasks.values()}
+    json_files.update(
+        "json/" + json_filename
+        for json_filename in os.listdir("json")
+        if json_filename.endswith(".json")
+    )
+    for json_file in sorted(json_files):
+        html_file = "html/" + os.path.basename(json_file).replace(".json", ".html")
+        task = BuildTask("json", json_file, html_file)
+        task.dependencies.add(json_file)
+        if os.path.exists(json_file):
+            task.dependencies.update(
+                manifest.chart_dependencies(json_file, file_hash(json_file))
+            )
+        tasks[task.output_file] = task
+
+    # Only keep dependencies that are produced by another task
+    for task in tasks.values():
+        task.dependencies &= tasks.keys()
+        for dependency in task.dependencies:
+            tasks[dependency].dependents.append(task)
+
+    return list(tasks.values())
+
+
+def build(
+    manifest: BuildManifest, jobs: int = 1, force: bool = False
+) -> Tuple[Dict[str, float], int, List[str]]:
+    """
+    Run every conversion that is out of date, in dependency order, using up to `jobs` worker
+    processes. Returns the wall time of every conversion that ran, the number of skipped ones, and
+    the outputs of the conversions that failed.
+
+    A failed conversion may leave the output of a previous build in place, so it isn't recorded in
+    the manifest, and the next build runs it again.
+
+    With a single job, the conversions run in the current process instead.
+    """
+    with phase("build graph"):
+        tasks = build_graph(manifest)
+    remaining = {task.output_file: len(task.dependencies) for task in tasks}
+    ready = [task for task in tasks if not task.dependencies]
+    running: Dict[Future, Tuple[BuildTask, Dict[str, Optional[str]]]] = {}
+    timings: Dict[str, float] = {}
+    skipped = 0
+    failed: List[str] = []
+
+    def mark_done(task: BuildTask) -> None:
+        for dependent in task.dependents:
+            remaining[dependent.output_file] -= 1
+            if remaining[dependent.output_file] == 0:
+                ready.append(dependent)
+
+    with contextlib.ExitStack() as stack:
+        executor = None
+        if jobs > 1:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+
+        while ready or running:
+            while ready:
+                task = ready.pop(0)
+                with phase("hash inputs"):
+                    inputs = task.inputs(manifest)
+                    up_to_date = manifest.is_up_to_date(task.output_file, inputs)
+                if not force and up_to_date:
+                    skipped += 1
+                    mark_done(task)
+                    continue
+                if executor is None:
+                    future = run_task_inline(
+                        task.kind, task.input_file, task.output_file
+                    )
+                else:
+                    future = executor.submit(
+                        run_task,
+                        task.kind,
+                        task.input_file,
+                        task.output_file,
+                        profiler.enabled,
+                    )
+                running[future] = (task, inputs)
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task, inputs = running.pop(future)
+                timings[task.output_file], written, report = future.result()
+                if report is not None:
+                    profiler.merge_report(report)
+                if not written:
+                    failed.append(task.output_file)
+                    manifest.forget(task.output_file)
+                elif task.kind == "csv":
+                    manifest.record(task.output_file, inputs)
+                else:
+                    manifest.record(
+                        task.output_file,
+                        inputs,
+                        source=task.input_file,
+                        dependencies=task.chart_refs,
+                    )
+                manifest.save()
+                mark_done(task)
+
+    return (timings, skipped, failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="seqsee-convert-all",
+        description="Convert every CSV file in csv/ to JSON, then every JSON file in json/ to HTML.",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="rebuild every output, even if its inputs haven't changed",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of conversions to run in parallel (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=default_manifest_file,
+        help=f"file recording the state of the previous build (default: {default_manifest_file})",
+    )
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+
+    with profiling(args):
+        manifest = BuildManifest(args.manifest)
+        timings, skipped, failed = build(manifest, jobs=args.jobs, force=args.force)
 
-    # Then process all the json files in the json directory
-    for json_filename in os.listdir("json"):
-        if json_filename.endswith(".json"):
-            html_filename = json_filename.replace(".json", ".html")
-            process_json("json/" + json_filename, "html/" + html_filename)
+    if timings:
+        print("Wall time per output:")
+        for output_file, elapsed in sorted(timings.items(), key=lambda item: -item[1]):
+            print(f"  {elapsed:8.2f}s  {output_file}")
+    if skipped:
+        print(f"Skipped {skipped} up-to-date outputs.")
+    if failed:
+        print(f"Failed to generate {len(failed)} outputs:")
+        for output_file in sorted(failed):
+            print(f"  {output_file}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,18 @@
 # Lifted/adapted from MIT-licensed https://github.com/slacy/pyssed/
-import copy
-from typing import Dict, List, Self, Union
+import functools
+from typing import Dict, List, Self, Tuple, Union
 
-from seqsee.chart_internals import Attribute, Attributes
+from seqsee.chart_internals import (
+    Attribute,
+    Attributes,
+    AttributesKey,
+    attributes_key,
+    interned_attributes,
+)
+
+# Maximum number of distinct attribute lists whose inline styles we keep around. Charts typically
+# only use a handful of combinations, so this is mostly a safeguard against unbounded growth.
+STYLE_CACHE_SIZE = 1024
 
 
 class CssStyle:
@@ -31,21 +41,37 @@ class CssStyle:
         return self._styles.items()
 
     def append(self, other):
-        """Append style 'other' to self."""
-        self._styles = self.__add__(other)._styles
-
-    def __add__(self, other):
-        """Add self and other, and return a new style instance."""
-        summed = copy.deepcopy(self)
+        """Merge style 'other' into self, in place."""
         if isinstance(other, str):
             single = other.split(":")
-            summed._styles[single[0]] = single[1]
+            self._styles[single[0]] = single[1]
         elif isinstance(other, dict):
-            summed._styles.update(other)
+            self._styles.update(other)
         elif isinstance(other, CssStyle):
-            summed._styles.update(other._styles)
+            self._styles.update(other._styles)
         else:
-            raise "Bad type for style"
+            raise TypeError("Bad type for style")
+
+    def copy(self):
+        """
+        Return a snapshot of self that can be modified without affecting the original.
+
+        Merging only ever replaces top-level entries, so nested styles can safely be shared between
+        the snapshot and the original. This makes the copy cheap compared to a deep copy.
+        """
+        snapshot = CssStyle()
+        snapshot._styles = dict(self._styles)
+        return snapshot
+
+    def __iadd__(self, other):
+        """Merge other into self in place, and return self."""
+        self.append(other)
+        return self
+
+    def __add__(self, other):
+        """Add self and other, and return a new style instance."""
+        summed = self.copy()
+        summed.append(other)
         return summed
 
     def __repr__(self):
@@ -164,3 +190,48 @@ def style_and_aliases_from_attributes(attributes: Attributes):
             # This is a style alias
             aliases.append(attr)
     return (new_style, aliases)
+
+
+@functools.lru_cache(maxsize=STYLE_CACHE_SIZE)
+def _inline_style_and_classes(key: AttributesKey) -> Tuple[str, str]:
+    attributes: Attributes = [
+        attr if isinstance(attr, str) else Attribute(**dict(attr)) for attr in key
+    ]
+    style, aliases = style_and_aliases_from_attributes(attributes)
+    inline_style = style.generate(indent=0).replace("\n", " ").strip(" {}")
+    return (inline_style, " ".join(aliases))
+
+
+def inline_style_and_classes(attributes: Attributes) -> Tuple[str, str]:
+    """
+    Given a list of attributes, return the contents of the `style` attribute and the
+    space-separated list of alias classes for an SVG element.
+
+    Charts usually reuse a small number of attribute lists across thousands of nodes and edges, so
+    the results are memoized on the canonical form of the list. Use `style_cache_info()` to inspect
+    the hit and miss counters of the cache.
+    """
+    return _inline_style_and_classes(attributes_key(attributes))
+
+
+@functools.lru_cache(maxsize=STYLE_CACHE_SIZE)
+def interned_style_and_classes(attributes_id: int) -> Tuple[str, str]:
+    """Same as `inline_style_and_classes`, for an attribute list interned by `intern_attributes`."""
+    return inline_style_and_classes(interned_attributes(attributes_id))
+
+
+def style_cache_info():
+    """
+    Return the statistics (hits, misses, maxsize, currsize) of the inline style cache. Nodes and
+    edges look their styles up by interned attribute list first, so a hit in either cache counts,
+    and a miss is a style that had to be computed.
+    """
+    interned = interned_style_and_classes.cache_info()
+    canonical = _inline_style_and_classes.cache_info()
+    return canonical._replace(hits=interned.hits + canonical.hits)
+
+
+def clear_style_cache() -> None:
+    """Empty the inline style cache and reset its statistics."""
+    _inline_style_and_classes.cache_clear()
+    interned_style_and_classes.cache_clear()
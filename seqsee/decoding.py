@@ -0,0 +1,42 @@
+import json
+import mmap
+import os
+from typing import Any, Callable, Dict
+
+# Parsers that turn the bytes of a JSON document into Python objects, in order of preference. The
+# fast one is an optional dependency (`pip install seqsee[fast]`), and the standard library is
+# always there as a fallback.
+decoders: Dict[str, Callable[[Any], Any]] = {}
+
+try:
+    import orjson  # type: ignore
+
+    decoders["orjson"] = orjson.loads
+except ImportError:
+    pass
+
+decoders["json"] = json.loads
+
+# Decoders that can parse a buffer in place, so that large inputs can be memory-mapped rather than
+# read into a copy first
+buffer_decoders = {"orjson"}
+
+# Inputs at least this large are memory-mapped when the decoder supports it
+mmap_threshold = 2**20
+
+default_decoder = next(iter(decoders))
+
+
+def load_json(path, decoder: str = default_decoder) -> Any:
+    """Parse a JSON file with the given decoder, by default the fastest one available."""
+    decode = decoders[decoder]
+    with open(path, "rb") as f:
+        if (
+            decoder in buffer_decoders
+            and os.fstat(f.fileno()).st_size >= mmap_threshold
+        ):
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # The view has to be released before the map is closed
+                with memoryview(data) as view:
+                    return decode(view)
+        return decode(f.read())
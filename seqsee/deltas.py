@@ -0,0 +1,168 @@
+import json
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from seqsee.tiles import StyleTable
+
+# An edit of a list of records: a positive integer keeps that many records of the previous list, a
+# negative integer drops that many, and a record is inserted as is.
+Operation = Union[int, list]
+
+# Number of records of a delta that are encoded to JSON at a time
+delta_batch_size = 1000
+
+
+def record_delta(
+    previous_keys: Sequence[Hashable],
+    previous_records: Optional[Sequence[list]],
+    keys: Sequence[Hashable],
+    records: Sequence[list],
+) -> Tuple[List[Operation], List[list]]:
+    """
+    Return the operations that turn the previous list of records into the current one, matching
+    records by key. Records that are kept but whose contents changed are returned separately,
+    unless `previous_records` is `None`, which means that records never change.
+
+    Records are matched greedily, in order. This takes linear time, and finds the same matches as a
+    longest common subsequence as long as records keep their relative order, which they do between
+    the pages of a spectral sequence. At worst, the chart is written in full.
+    """
+    # The positions of the records with the same key are chained together, from the first unmatched
+    # one onwards. This is a lot lighter than a list of positions per key.
+    first: Dict[Hashable, int] = {}
+    next_position = [-1] * len(previous_keys)
+    for position in range(len(previous_keys) - 1, -1, -1):
+        key = previous_keys[position]
+        next_position[position] = first.get(key, -1)
+        first[key] = position
+
+    operations: List[Operation] = []
+    changed = []
+    position = 0
+    for key, record in zip(keys, records):
+        match = first.get(key, -1)
+        while 0 <= match < position:
+            match = next_position[match]
+        if match < 0:
+            first[key] = -1
+            operations.append(record)
+            continue
+        first[key] = next_position[match]
+        if match > position:
+            operations.append(position - match)
+        if operations and isinstance(operations[-1], int) and operations[-1] > 0:
+            operations[-1] += 1
+        else:
+            operations.append(1)
+        if previous_records is not None and previous_records[match] != record:
+            changed.append(record)
+        position = match + 1
+    return (operations, changed)
+
+
+class ChartDeltas:
+    """
+    The nodes and edges of the charts of a collection, each chart being stored as the differences
+    with the previous one. Consecutive pages of a spectral sequence share most of their contents,
+    so this is much smaller than writing every chart in full. Only the records of the previous chart
+    are kept, and the delta of each chart is written right after it, so that rendering a collection
+    still streams.
+
+    Nodes are records `[id, x, y, style, label]`, where the id is shared by all nodes with the same
+    name, the coordinates are in chart units and the style is an index into the `StyleTable`. Edges
+    are records `[style, source, target]` or `[style, source, target, bezier]`, where the source
+    and target are node ids, or the target is an `[x, y]` offset, and `bezier` has the coordinates
+    of the control points. Since edges refer to their endpoints by id, moving a node doesn't
+    change its edges.
+
+    The style table is shared by all the charts, and each delta carries the styles that were added
+    to it since the previous one.
+    """
+
+    def __init__(self):
+        self.styles = StyleTable()
+        self.count = 0
+        self._delta: Optional[dict] = None
+        self._written_styles = 0
+        self._node_ids: Dict[str, int] = {}
+        self._nodes: List[list] = []
+        self._edge_keys: List[tuple] = []
+
+    def node_id(self, name: str) -> int:
+        node_id = self._node_ids.get(name)
+        if node_id is None:
+            node_id = self._node_ids[name] = len(self._node_ids)
+        return node_id
+
+    def add_chart(self, chart) -> int:
+        """
+        Add a prepared chart after the previous one, and return its position in the sequence. Its
+        delta is then available from `delta_json`.
+        """
+        nodes = []
+        for name, node in chart.nodes.items():
+            style = self.styles.index("circle", node.attributes_id)
+            label = "" if node.label is None else node.label
+            nodes.append(
+                [self.node_id(name), node.absoluteX, node.absoluteY, style, label]
+            )
+
+        edges = []
+        for edge in chart.edges:
+            style = self.styles.index(
+                "path" if edge.bezier else "line", edge.attributes_id
+            )
+            if edge.target is not None:
+                target = self.node_id(edge.target)
+            else:
+                target = [edge.offset.x, edge.offset.y]
+            record = [style, self.node_id(edge.source), target]
+            if edge.bezier:
+                record.append([c for point in edge.bezier for c in (point.x, point.y)])
+            edges.append(record)
+        edge_keys = [
+            tuple(
+                tuple(value) if isinstance(value, list) else value for value in record
+            )
+            for record in edges
+        ]
+
+        node_operations, changed_nodes = record_delta(
+            [record[0] for record in self._nodes],
+            self._nodes,
+            [record[0] for record in nodes],
+            nodes,
+        )
+        # Edges are identified by their whole record, so they never change
+        edge_operations, _ = record_delta(self._edge_keys, None, edge_keys, edges)
+
+        self._delta = {
+            "scale": chart.header.chart.scale,
+            "styles": self.styles.entries[self._written_styles :],
+            "nodes": node_operations,
+            "changedNodes": changed_nodes,
+            "edges": edge_operations,
+        }
+        self._written_styles = len(self.styles.entries)
+        self._nodes, self._edge_keys = nodes, edge_keys
+        self.count += 1
+        return self.count - 1
+
+    def delta_json(self) -> Iterator[str]:
+        """
+        Return the delta of the last chart added as pieces of JSON, safe to embed in a `<script>`
+        element, and forget it. The records are encoded a batch at a time, since encoding them all
+        at once takes several times the size of the result.
+        """
+        assert self._delta is not None, "No chart was added since the last delta"
+        data, self._delta = self._delta, None
+        records = {key: data.pop(key) for key in ["nodes", "changedNodes", "edges"]}
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        # Pieces end between two values, so they can't split a `</`
+        yield encode(data)[:-1].replace("</", "<\\/")
+        for key, values in records.items():
+            yield f',"{key}":['
+            for start in range(0, len(values), delta_batch_size):
+                batch = encode(values[start : start + delta_batch_size])[1:-1]
+                yield ("," if start else "") + batch.replace("</", "<\\/")
+            yield "]"
+        yield "}"
@@ -1,9 +1,14 @@
+import argparse
+import collections
+import functools
+import json
+import os
 import pandas as pd  # type: ignore
 import re
 import sys
 from compact_json import Formatter  # type: ignore
-from jsonschema import validate
-from .main import load_schema
+from .profiling import add_profiling_arguments, phase, profiling
+from .schema import validate_spec
 
 # Regular expressions for substitutions
 substitutions = [
@@ -34,6 +39,20 @@ substitutions = [
     (re.compile(r"\b([a-zA-Z{}]+)\^(\d+)\b"), r"\1^{\2}"),
 ]
 
+# Every substitution except the first one matches within a single space-separated token, and a space
+# looks exactly like the start or end of the string to all of them (same `\b` boundaries, and never
+# a brace). They can therefore be applied token by token. The only context that leaks into a token
+# is the `\overline{...}` wrapper around the whole name, which the substitutions leave untouched.
+token_substitutions = substitutions[1:]
+
+# Matches exactly when at least one of the token substitutions applies to a string. Tokens that
+# don't match are left unchanged by the whole chain, so we can skip it entirely.
+token_may_change = re.compile(
+    "|".join(f"(?:{pattern.pattern})" for pattern, _ in token_substitutions)
+)
+
+overline_open = "\\overline{"
+
 # Regular expression for detecting "again" suffixes. We strip anything that is whitespace followed
 # by any number of non-word characters, then the word "again", and then anything else until the end
 # of the line.
@@ -41,20 +60,84 @@ detect_again = re.compile(r"\s\W*again.*")
 
 arrow_length = 0.7
 
-
-def try_get_key(row, key, default=None):
+schema_url = "https://raw.githubusercontent.com/JoeyBF/SeqSee/refs/heads/master/seqsee/input_schema.json"
+
+# Rows of the CSV read at a time by `stream_csv`
+default_chunk_rows = 10_000
+
+# Columns that `nodes_to_json` reads, the only ones needed in the first pass of `stream_csv`
+node_columns = {"name", "stem", "Adams filtration", "weight", "shift", "tautorsion"}
+
+# Types of the coordinate columns when reading the CSV in chunks, which `nodes_to_json` converts to
+# integers anyway. Every other column is read as a string. Otherwise pandas would guess the types of
+# every chunk from its own values, and a column could be read as integers in one chunk and as floats
+# in the next.
+chunk_dtypes = {
+    "stem": "Int64",
+    "Adams filtration": "Int64",
+}
+
+# Other numeric columns of the nodes. Their types are found from the whole file first, like
+# `pd.read_csv` does in `process_csv`, and every chunk is then converted to them.
+chunk_numeric_columns = {"weight", "shift", "tautorsion"}
+
+
+# Aliases shared by every chart generated from the CSV files
+aliases = {
+    "attributes": {
+        "defaultNode": [{"color": "gray"}],
+        "defaultEdge": [{"color": "gray", "thickness": 0.02}],
+        "tau1": [{"color": "red"}],
+        "tau2": [{"color": "blue"}],
+        "tau3": [{"color": "darkgreen"}],
+        "tau4plus": [{"color": "purple"}],
+        "dr": [{"color": "darkcyan"}],
+        "n2": [{"color": "darkcyan"}],
+        "n3": [{"color": "red"}],
+        "n4": [{"color": "darkgreen"}],
+        "n5": [{"color": "blue"}],
+        "n6": [{"color": "orange"}],
+        "n7": [{"color": "orange"}],
+        "n8": [{"color": "orange"}],
+        "n9": [{"color": "orange"}],
+        "n10": [{"color": "orange"}],
+        "n11": [{"color": "orange"}],
+        "t": [{"color": "magenta"}],
+        "t2": [{"color": "orange"}],
+        "t3": [{"color": "orange"}],
+        "t4": [{"color": "orange"}],
+        "t5": [{"color": "orange"}],
+        "t6": [{"color": "orange"}],
+        "p": [{"pattern": "dashed"}],
+        "hh0": [{"color": "red"}],
+        "hh1": [{"color": "blue"}],
+        "hh2": [{"color": "darkgreen"}],
+        "tauextn": [{"color": "darkgreen"}],
+        "free": [{"arrowTip": "simple"}],
+        "h1tower": ["tau1", {"arrowTip": "simple"}],
+    },
+    "colors": {
+        "darkcyan": "#00B3B3",
+        "darkgreen": "#00B300",
+        "gray": "#666666",
+        "red": "#FF0000",
+        "magenta": "#FF00FF",
+    },
+}
+
+
+def column_values(df, column, default=None):
     """
-    Get a key from a row.
+    Get the values of a column as a list of Python objects.
 
-    Return a default value if the key is not present or the value is `nan`.
+    Missing values (`nan`) are replaced by a default value, and so is every value if the column is
+    not present at all.
     """
 
-    try:
-        if pd.isna(row[key]):
-            return default
-        return row[key]
-    except KeyError:
-        return default
+    if column not in df:
+        return [default] * len(df)
+    values = df[column].astype(object)
+    return values.where(values.notna(), default).tolist()
 
 
 def edge_offset(edge_type, arrow_length=1):
@@ -73,10 +156,10 @@ def edge_offset(edge_type, arrow_length=1):
     return offset
 
 
-def extract_node_attributes(row):
+def extract_node_attributes(tautorsion):
     ret = []
-    if row.get("tautorsion", []):
-        torsion = int(row["tautorsion"])
+    if tautorsion:
+        torsion = int(tautorsion)
         if torsion >= 4:
             ret.append("tau4plus")
         elif torsion > 0:
@@ -84,20 +167,14 @@ def extract_node_attributes(row):
     return ret
 
 
-def extract_edge_attributes(row, edge_type, nodes):
+def extract_edge_attributes(edge_type, target_node, target_info, nodes):
     ret = []
-    target_node = row[f"{edge_type}target"]
-    # Info fields are sometimes missing, so we default to an empty string
-    target_info = try_get_key(row, f"{edge_type}info")
     if edge_type == "dr":
         ret.append("dr")
     elif target_node in nodes:
         # Edges into a node inherit the attributes of their target, as long as they aren't
         # differentials
-        target_node_attributes = try_get_key(
-            nodes.get(target_node, {}), "attributes", default=[]
-        )
-        ret.extend(target_node_attributes)
+        ret.extend(nodes[target_node].get("attributes", []))
     if target_node == "loc" or target_info == "loc":
         # This edge is an arrow
         if edge_type == "h1":
@@ -123,11 +200,46 @@ def extract_edge_attributes(row, edge_type, nodes):
     return ret
 
 
+def apply_substitutions(text, substitutions=substitutions):
+    """Apply substitutions one after the other. This is the reference implementation for labels."""
+    for pattern, replacement in substitutions:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+@functools.lru_cache(maxsize=2**16)
+def transform_token(token):
+    """Apply the token substitutions to a single token. Generators repeat a lot, so we memoize."""
+    if not token_may_change.search(token):
+        return token
+    return apply_substitutions(token, token_substitutions)
+
+
+def transform_label(node_name):
+    """
+    Compute the same result as `apply_substitutions(node_name)` by splitting the name into
+    space-separated tokens and transforming each token independently. The substitutions still run
+    one after the other on a token, but only on the first occurrence of tokens that one of them
+    matches.
+    """
+    if "\n" in node_name:
+        # Newlines change what `^_(.*)$` matches, so just use the reference implementation
+        return apply_substitutions(node_name)
+
+    is_overlined = node_name.startswith("_")
+    tokens = (node_name[1:] if is_overlined else node_name).split(" ")
+    if is_overlined:
+        # Transform the boundary tokens together with the wrapper, since the lookarounds and word
+        # boundaries can see it
+        tokens[0] = overline_open + tokens[0]
+        tokens[-1] = tokens[-1] + "}"
+    return " ".join([transform_token(token) for token in tokens])
+
+
+@functools.lru_cache(maxsize=2**16)
 def label_from_node_name(node_name):
     """Apply substitutions to a node name to generate a label, wrapped in dollar signs for Latex."""
-    label = node_name
-    for pattern, replacement in substitutions:
-        label = pattern.sub(replacement, label)
+    label = transform_label(node_name)
     if label:
         label = f"${label}$"
     return label
@@ -149,80 +261,129 @@ def deduplicate_name(name):
     return (name, False)
 
 
-def nodes_to_json(df):
+def deduplicate_names(df):
+    """
+    Apply `deduplicate_name` to the whole `name` column at once. Returns the list of deduplicated
+    names and the list of flags telling whether each row was a duplicate.
+    """
+
+    names = df["name"]
+    is_wrapped = names.str.startswith("(") & names.str.endswith(")")
+    names = names.where(~is_wrapped, names.str[1:-1])
+    is_duplicate = names.str.contains(detect_again)
+    names = names.str.replace(detect_again, "", regex=True)
+    return (names.tolist(), is_duplicate.tolist())
+
+
+def nodes_to_json(df, names=None):
+    if names is None:
+        names = deduplicate_names(df)
+    node_names, is_duplicate = names
+
     nodes = {}
-    for _, row in df.iterrows():
+    for node_name, duplicate, x, y, weight, shift, tautorsion in zip(
+        node_names,
+        is_duplicate,
+        df["stem"].astype(int).tolist(),
+        df["Adams filtration"].astype(int).tolist(),
+        column_values(df, "weight"),
+        column_values(df, "shift"),
+        column_values(df, "tautorsion"),
+    ):
         # Process node information
-
-        node_name, is_duplicate = deduplicate_name(row["name"])
-        if is_duplicate:
+        if duplicate:
             continue
 
-        x = int(row["stem"])
-        y = int(row["Adams filtration"])
         node_data = {
             "x": x,
             "y": y,
             "label": label_from_node_name(node_name),
         }
-        if try_get_key(row, "weight", None):
-            node_data["label"] += f"    ({row['weight']})"
-        if try_get_key(row, "shift", None):
-            node_data["position"] = int(row["shift"])
-        if attributes := extract_node_attributes(row):
+        if weight:
+            node_data["label"] += f"    ({weight})"
+        if shift:
+            node_data["position"] = int(shift)
+        if attributes := extract_node_attributes(tautorsion):
             # Only add an attributes key if there are attributes to add
             node_data["attributes"] = attributes
         nodes[node_name] = node_data
     return nodes
 
 
-def edges_to_json(df, nodes):
-    edges = []
-    for _, row in df.iterrows():
-        node_name, _ = deduplicate_name(row["name"])
-        for edge_type in ["h0", "h1", "h2", "dr"]:
-            target_col = f"{edge_type}target"
-            info_col = f"{edge_type}info"
-            if target_col not in row:
-                # In some CSVs, the target column is missing completely
-                continue
-            target_node = row[target_col]
-            target_info = try_get_key(row, info_col, "")
-            edge_data = {"source": node_name}
-            if pd.notna(target_node):
-                if target_node in nodes:
-                    # This is a structline
-                    edge_data["target"] = target_node
-                elif target_node == "loc" or target_info == "loc":
-                    # This is an arrow
-                    edge_data["offset"] = edge_offset(edge_type, arrow_length)
-                else:
-                    print(
-                        f"Invalid target node: ({target_node}) for {edge_type} on ({node_name})"
-                    )
-                    continue
-            elif target_info == "free" or target_info == "loc":
-                # This is also an arrow, but with a different notation
+def edges_of_type(df, node_names, nodes, edge_type):
+    """
+    Build the edges of a given type. Returns a list with one entry per row of `df`, which is either
+    the edge starting at that row, or `None` if there isn't one.
+    """
+
+    ret = [None] * len(df)
+    target_col = f"{edge_type}target"
+    info_col = f"{edge_type}info"
+    if target_col not in df:
+        # In some CSVs, the target column is missing completely
+        return ret
+
+    # Only look at the rows that can possibly give an edge: the ones with a target, or with an
+    # info field that makes them a freestanding arrow
+    has_target = df[target_col].notna()
+    candidates = has_target
+    if info_col in df:
+        candidates = candidates | df[info_col].isin(["free", "loc"])
+    rows = candidates.to_numpy().nonzero()[0]
+
+    candidate_rows = df.iloc[rows]
+    targets = column_values(candidate_rows, target_col)
+    infos = column_values(candidate_rows, info_col)
+    for row, target_node, target_info in zip(rows, targets, infos):
+        edge_data = {"source": node_names[row]}
+        if target_node is not None:
+            if target_node in nodes:
+                # This is a structline
+                edge_data["target"] = target_node
+            elif target_node == "loc" or target_info == "loc":
+                # This is an arrow
                 edge_data["offset"] = edge_offset(edge_type, arrow_length)
             else:
-                # no edge to be drawn
+                print(
+                    f"Invalid target node: ({target_node}) for {edge_type} on ({node_names[row]})"
+                )
                 continue
+        else:
+            # This is also an arrow, but with a different notation
+            edge_data["offset"] = edge_offset(edge_type, arrow_length)
 
-            if attributes := extract_edge_attributes(row, edge_type, nodes=nodes):
-                # Only add an attributes key if there are attributes to add
-                edge_data["attributes"] = attributes
+        if attributes := extract_edge_attributes(
+            edge_type, target_node, target_info, nodes
+        ):
+            # Only add an attributes key if there are attributes to add
+            edge_data["attributes"] = attributes
 
-            edges.append(edge_data)
-        # Check for `tauextn` if we're printing an E_infinity page
-        if target_node := try_get_key(row, "tauextn"):
-            if target_node in nodes:
-                edges.append(
-                    {
-                        "source": node_name,
-                        "target": target_node,
-                        "attributes": ["tauextn"],
-                    }
-                )
+        ret[row] = edge_data
+    return ret
+
+
+def edges_to_json(df, nodes, names=None):
+    if names is None:
+        names = deduplicate_names(df)
+    node_names, _ = names
+
+    edges_by_type = [
+        edges_of_type(df, node_names, nodes, edge_type)
+        for edge_type in ["h0", "h1", "h2", "dr"]
+    ]
+
+    # Check for `tauextn` if we're printing an E_infinity page
+    tauextn_edges = [
+        {"source": node_name, "target": target_node, "attributes": ["tauextn"]}
+        if target_node and target_node in nodes
+        else None
+        for node_name, target_node in zip(node_names, column_values(df, "tauextn"))
+    ]
+
+    # Interleave the edges so that they are listed row by row
+    edges = []
+    for row_edges in zip(*edges_by_type, tauextn_edges):
+        edges.extend(edge for edge in row_edges if edge is not None)
     return edges
 
 
@@ -252,71 +413,40 @@ def get_metadata(title):
     return meta
 
 
-def process_csv(input_file, output_file):
-    # Define the JSON schema
-    schema = load_schema()
-
-    # Load CSV data
-    df = pd.read_csv(input_file)
-
+def get_header(input_file):
     # Parse reasonable title
     title = input_file.split("/")[-1].split(".")[0]
 
     # Build a header that complies with the schema
-    header = {
+    return {
         "metadata": get_metadata(title),
-        "aliases": {
-            "attributes": {
-                "defaultNode": [{"color": "gray"}],
-                "defaultEdge": [{"color": "gray", "thickness": 0.02}],
-                "tau1": [{"color": "red"}],
-                "tau2": [{"color": "blue"}],
-                "tau3": [{"color": "darkgreen"}],
-                "tau4plus": [{"color": "purple"}],
-                "dr": [{"color": "darkcyan"}],
-                "n2": [{"color": "darkcyan"}],
-                "n3": [{"color": "red"}],
-                "n4": [{"color": "darkgreen"}],
-                "n5": [{"color": "blue"}],
-                "n6": [{"color": "orange"}],
-                "n7": [{"color": "orange"}],
-                "n8": [{"color": "orange"}],
-                "n9": [{"color": "orange"}],
-                "n10": [{"color": "orange"}],
-                "n11": [{"color": "orange"}],
-                "t": [{"color": "magenta"}],
-                "t2": [{"color": "orange"}],
-                "t3": [{"color": "orange"}],
-                "t4": [{"color": "orange"}],
-                "t5": [{"color": "orange"}],
-                "t6": [{"color": "orange"}],
-                "p": [{"pattern": "dashed"}],
-                "hh0": [{"color": "red"}],
-                "hh1": [{"color": "blue"}],
-                "hh2": [{"color": "darkgreen"}],
-                "tauextn": [{"color": "darkgreen"}],
-                "free": [{"arrowTip": "simple"}],
-                "h1tower": ["tau1", {"arrowTip": "simple"}],
-            },
-            "colors": {
-                "darkcyan": "#00B3B3",
-                "darkgreen": "#00B300",
-                "gray": "#666666",
-                "red": "#FF0000",
-                "magenta": "#FF00FF",
-            },
-        },
+        "aliases": aliases,
     }
 
+
+def process_csv(input_file, output_file):
+    """Convert a CSV file to a SeqSee JSON file. Returns whether the chart was written."""
+    # Load CSV data
+    with phase("read csv"):
+        df = pd.read_csv(input_file)
+
+    header = get_header(input_file)
+
+    # Deduplicate the names of every row once, since both nodes and edges need them
+    with phase("names"):
+        names = deduplicate_names(df)
+
     # Process nodes first
-    nodes = nodes_to_json(df)
+    with phase("nodes"):
+        nodes = nodes_to_json(df, names)
 
     # Process edges after, since they depend on nodes
-    edges = edges_to_json(df, nodes)
+    with phase("edges"):
+        edges = edges_to_json(df, nodes, names)
 
     # Combine the data into a single JSON object
     json_data = {
-        "$schema": "https://raw.githubusercontent.com/JoeyBF/SeqSee/refs/heads/master/seqsee/input_schema.json",
+        "$schema": schema_url,
         "header": header,
         "nodes": nodes,
         "edges": edges,
@@ -324,24 +454,215 @@ def process_csv(input_file, output_file):
 
     # Validation and output
     try:
-        validate(instance=json_data, schema=schema)
-        formatter = Formatter()
-        formatter.indent_spaces = 2
-        formatter.dump(json_data, output_file)
+        with phase("validate"):
+            validate_spec(json_data)
+        with phase("write"):
+            formatter = Formatter()
+            formatter.indent_spaces = 2
+            formatter.dump(json_data, output_file)
         print("JSON data successfully generated and validated against the schema.")
     except Exception as e:
         print("Validation error:", e)
+        return False
+    return True
 
 
-def main():
-    if len(sys.argv) != 3:
-        print("Usage: jsonmaker <input.csv> <output.json>")
-        sys.exit(1)
+def read_csv_chunks(input_file, chunk_rows, columns=None):
+    """
+    Read a CSV file in data frames of `chunk_rows` rows, with only the given columns if any. The
+    coordinates are read as nullable integers, and the other columns as strings.
+    """
+    return pd.read_csv(
+        input_file,
+        chunksize=chunk_rows,
+        dtype=collections.defaultdict(lambda: "string", chunk_dtypes),
+        usecols=None if columns is None else (lambda column: column in columns),
+    )
+
 
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+def numeric_column_types(input_file, chunk_rows):
+    """
+    Return the types that `pd.read_csv` gives to the `chunk_numeric_columns` of a whole CSV file,
+    reading only those columns chunk by chunk. A column holds integers if all of its values are
+    integers, floats if some are missing or fractional, and strings if some aren't numbers.
+    """
+    column_types = {}
+    with read_csv_chunks(input_file, chunk_rows, chunk_numeric_columns) as chunks:
+        for chunk in chunks:
+            for column in chunk:
+                if column_types.get(column) == "string":
+                    continue
+                try:
+                    values = pd.to_numeric(chunk[column])
+                except ValueError:
+                    column_types[column] = "string"
+                    continue
+                if pd.api.types.is_integer_dtype(values) and not values.hasnans:
+                    column_types.setdefault(column, "Int64")
+                else:
+                    column_types[column] = "Float64"
+    return column_types
 
-    process_csv(input_file, output_file)
+
+def write_entries(f, entries, is_first):
+    """Write JSON entries on their own lines, after the previous ones. Returns whether none were."""
+    for entry in entries:
+        f.write("\n    " if is_first else ",\n    ")
+        f.write(entry)
+        is_first = False
+    return is_first
+
+
+def stream_nodes(input_file, header, chunk_rows, f):
+    """
+    Write the nodes of a CSV file chunk by chunk, and return an index of their names. The index
+    maps every name to the part of its node that edges depend on, which is its attributes. Nodes
+    with the same attributes share an entry, so the index holds little more than the names.
+
+    Like in the dict built by `process_csv`, a node whose name is repeated keeps its first position
+    and takes its last value. A name that was already written by a previous chunk is not written
+    again, and its last value is returned as well, in a dict of the nodes to rewrite.
+    """
+    column_types = numeric_column_types(input_file, chunk_rows)
+    index = {}
+    entries = {}
+    rewritten = {}
+    is_first = True
+    with read_csv_chunks(input_file, chunk_rows, node_columns) as chunks:
+        for chunk in chunks:
+            for column, column_type in column_types.items():
+                if column_type != "string":
+                    chunk[column] = pd.to_numeric(chunk[column]).astype(column_type)
+            nodes = nodes_to_json(chunk)
+            validate_spec({"header": header, "nodes": nodes, "edges": []})
+            new_nodes = []
+            for name, node_data in nodes.items():
+                if name in index:
+                    rewritten[name] = node_data
+                else:
+                    new_nodes.append((name, node_data))
+                attributes = tuple(node_data.get("attributes", ()))
+                if attributes not in entries:
+                    entries[attributes] = {"attributes": list(attributes)}
+                index[name] = entries[attributes]
+            is_first = write_entries(
+                f,
+                (f"{json.dumps(name)}: {json.dumps(data)}" for name, data in new_nodes),
+                is_first,
+            )
+    return (index, rewritten)
+
+
+def rewrite_nodes(input_file, output_file, nodes):
+    """
+    Copy a JSON file written by `stream_csv` line by line, replacing the values of the given nodes.
+    This is only needed if some names are repeated across chunks, so it doesn't have to be fast.
+    """
+    decoder = json.JSONDecoder()
+    in_nodes = False
+    with open(input_file) as source, open(output_file, "w") as f:
+        for line in source:
+            if in_nodes and line.startswith('    "'):
+                entry = line.strip()
+                name, _ = decoder.raw_decode(entry)
+                if name in nodes:
+                    comma = "," if entry.endswith(",") else ""
+                    line = f"    {json.dumps(name)}: {json.dumps(nodes[name])}{comma}\n"
+            elif line.startswith('  "nodes": {'):
+                in_nodes = True
+            elif line.startswith("  }"):
+                in_nodes = False
+            f.write(line)
+
+
+def stream_edges(input_file, header, index, chunk_rows, f):
+    """Write the edges of a CSV file chunk by chunk, resolving their targets with the name index."""
+    is_first = True
+    with read_csv_chunks(input_file, chunk_rows) as chunks:
+        for chunk in chunks:
+            edges = edges_to_json(chunk, index)
+            validate_spec({"header": header, "nodes": {}, "edges": edges})
+            is_first = write_entries(f, map(json.dumps, edges), is_first)
+
+
+def stream_csv(input_file, output_file, chunk_rows=default_chunk_rows):
+    """
+    Convert a CSV file like `process_csv`, but read it `chunk_rows` rows at a time and write the
+    nodes and edges as they are built. Memory use is bounded by the index of the node names instead
+    of the size of the whole chart. Returns whether the chart was written.
+
+    The CSV is read twice: the first pass writes the nodes and indexes their names, and the second
+    one writes the edges, whose targets are looked up in the index. Every chunk is validated against
+    the schema on its own. The output has one node or edge per line, since the aligned layout of
+    `process_csv` depends on the whole chart.
+    """
+    header = get_header(input_file)
+    # Format the start of the chart like `process_csv` does, and leave the object open
+    formatter = Formatter()
+    formatter.indent_spaces = 2
+    start = formatter.serialize({"$schema": schema_url, "header": header})
+    start = start.rstrip().removesuffix("}").rstrip()
+    # Validation needs jsonschema anyway, and importing it here keeps it out of the startup time
+    import jsonschema
+
+    # Write to a separate file first, so that a failed conversion doesn't leave half a chart behind
+    partial_file = f"{output_file}.partial"
+    rewritten_file = f"{output_file}.rewritten.partial"
+    try:
+        with open(partial_file, "w") as f:
+            f.write(start + ',\n  "nodes": {')
+            with phase("nodes"):
+                index, rewritten = stream_nodes(input_file, header, chunk_rows, f)
+            f.write('\n  },\n  "edges": [')
+            with phase("edges"):
+                stream_edges(input_file, header, index, chunk_rows, f)
+            f.write("\n  ]\n}\n")
+        if rewritten:
+            with phase("rewrite nodes"):
+                rewrite_nodes(partial_file, rewritten_file, rewritten)
+                os.replace(rewritten_file, partial_file)
+    except jsonschema.ValidationError as e:
+        print("Validation error:", e)
+        return False
+    else:
+        os.replace(partial_file, output_file)
+        print("JSON data successfully generated and validated against the schema.")
+        return True
+    finally:
+        for leftover_file in [partial_file, rewritten_file]:
+            if os.path.exists(leftover_file):
+                os.remove(leftover_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="seqsee-jsonmaker",
+        description="Convert a CSV file of a spectral sequence to a SeqSee JSON file.",
+    )
+    parser.add_argument("input_file", metavar="input.csv")
+    parser.add_argument("output_file", metavar="output.json")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="read the CSV in chunks and write the JSON as it goes, so that memory use stays "
+        "bounded for very large inputs. The output has one node or edge per line",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=default_chunk_rows,
+        help="number of rows of the CSV read at a time with --stream (default: %(default)s)",
+    )
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+
+    with profiling(args):
+        if args.stream:
+            written = stream_csv(args.input_file, args.output_file, args.chunk_rows)
+        else:
+            written = process_csv(args.input_file, args.output_file)
+    if not written:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
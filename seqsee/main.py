@@ -1,14 +1,18 @@
-import importlib
-import json
-import jsonschema
+import argparse
+import base64
+import contextlib
+import functools
+import gzip
 import math
-import sys
+import numpy as np
 import os
 import pydantic
 
-from collections import defaultdict
+from collections import abc
+from concurrent.futures import ProcessPoolExecutor
 from importlib.resources import files
-from jinja2 import BaseLoader, Environment
+from jinja2 import Environment, FileSystemBytecodeCache, FunctionLoader
+from jinja2.bccache import Bucket
 from pathlib import Path
 from seqsee.chart_internals import (
     DimensionRange,
@@ -16,23 +20,111 @@ from seqsee.chart_internals import (
     Header,
     Node,
 )
-from typing import Callable, Dict, List, Optional, Union
+from seqsee.decoding import load_json
+from seqsee.deltas import ChartDeltas
+from seqsee.profiling import add_profiling_arguments, phase, profiling
+from seqsee.schema import schema_validator, validate_spec
+from seqsee.tiles import default_tile_size, tiles_payload
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 src_dir = files("seqsee")
 
 
-def load_schema():
-    with (src_dir / "input_schema.json").open("r") as f:
-        return json.load(f)
-
-
-schema = load_schema()
-chart_schema = schema["$defs"]["chart_spec"]
-
-
+def node_coordinates(nodes: abc.Collection[Node]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the arrays of the `x_coord()` and `y_coord()` of the nodes, i.e. their bidegrees if they
+    have one, or their absolute positions otherwise.
+    """
+
+    def coords(field: str, fallback: str) -> np.ndarray:
+        # Missing values become NaNs
+        values = np.array([getattr(node, field) for node in nodes], dtype=float)
+        missing = np.isnan(values)
+        if missing.any():
+            fallbacks = [getattr(node, fallback) for node in nodes]
+            values[missing] = np.array(fallbacks, dtype=float)[missing]
+        return values
+
+    return (coords("x", "absoluteX"), coords("y", "absoluteY"))
+
+
+def stable_order(*keys: np.ndarray) -> np.ndarray:
+    """
+    Return the permutation that sorts by the given integer-valued keys, the first one being the most
+    significant, keeping ties in their original order.
+
+    This is `np.lexsort(keys[::-1])`, except that whenever they fit, the keys are packed into a
+    single integer together with the original index of each element. The packed values are then
+    distinct, so they can be sorted with the default unstable algorithm, which is a lot faster.
+    """
+    count = len(keys[0])
+    packed = np.zeros(count, dtype=np.int64)
+    capacity = count
+    for key in keys:
+        low = int(key.min())
+        span = int(key.max()) - low + 1
+        capacity *= span
+        if capacity >= 2**63:
+            return np.lexsort(keys[::-1])
+        packed = packed * span + (key - low).astype(np.int64)
+    return np.argsort(packed * count + np.arange(count))
+
+
+def range_mask(coords: np.ndarray, dim_range: DimensionRange) -> np.ndarray:
+    """Vectorized version of `coord in dim_range`."""
+    mask = np.ones(len(coords), dtype=bool)
+    if dim_range.min is not None:
+        mask &= coords >= dim_range.min
+    if dim_range.max is not None:
+        mask &= coords <= dim_range.max
+    return mask
+
+
+def chart_payload(markup: str, compress: bool) -> str:
+    """
+    Template filter for the markup of a chart. In the lazy collection mode, the markup is gzipped
+    and base64-encoded, and the page only decompresses it when the chart is shown.
+    """
+    if not compress:
+        return markup
+    # Fix the timestamp so that the output is reproducible
+    compressed = gzip.compress(markup.encode(), compresslevel=6, mtime=0)
+    return base64.b64encode(compressed).decode("ascii")
+
+
+class TemplateCache(FileSystemBytecodeCache):
+    """
+    Compiled templates, stored on disk so that the template is only compiled once per version of
+    SeqSee instead of on every run. This is only an optimization, so failing to write to the cache
+    is not an error.
+    """
+
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+def template_cache() -> Optional[TemplateCache]:
+    """Return the cache of compiled templates in the user cache directory, if we can create it."""
+    try:
+        cache_root = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        cache_dir = Path(cache_root) / "seqsee"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    except (OSError, RuntimeError):
+        return None
+    return TemplateCache(str(cache_dir))
+
+
+@functools.cache
 def load_template():
-    template_text = (src_dir / "template.html.jinja").read_text()
-    return Environment(loader=BaseLoader()).from_string(template_text)
+    environment = Environment(
+        bytecode_cache=template_cache(),
+        loader=FunctionLoader(lambda name: (src_dir / name).read_text()),
+    )
+    environment.filters["chart_payload"] = chart_payload
+    return environment.get_template("template.html.jinja")
 
 
 class Chart(pydantic.BaseModel):
@@ -41,11 +133,20 @@ class Chart(pydantic.BaseModel):
     edges: List[Edge] = []
 
     model_config = pydantic.ConfigDict(extra="allow")
-
-    def __init__(self, **chart_spec):
-        # validate against schema
-        jsonschema.validate(instance=chart_spec, schema=schema)
-        super().__init__(**chart_spec)
+    _is_prepared: bool = False
+    _edges_svg: Optional[List[str]] = None
+    _nodes_svg: Optional[List[str]] = None
+    _tiles_payload: Optional[str] = None
+
+    @pydantic.model_validator(mode="before")
+    @classmethod
+    def validate_against_schema(cls, data, info: pydantic.ValidationInfo):
+        # Validate against the schema, unless the caller tells us that the input is trusted, either
+        # because it has been validated already or because pydantic's structural check is enough.
+        if not (info.context or {}).get("trusted", False):
+            with phase("validate"):
+                validate_spec(data, "chart_spec")
+        return data
 
     def normalize_chart_dimensions(self) -> None:
         """
@@ -58,24 +159,24 @@ class Chart(pydantic.BaseModel):
         if there are no nodes.
         """
 
+        x_coords, y_coords = node_coordinates(self.nodes.values())
+
         def compute_dimension_bounds(
-            dim_range: DimensionRange, coord: Callable[[Node], float], default: int
+            dim_range: DimensionRange, coords: np.ndarray, default: int
         ) -> None:
-            coords = [coord(node) for node in self.nodes.values()]
-
             if dim_range.min is None:
                 # Greatest even number strictly smaller than the minimum coordinate of any node
-                dimension = 2 * (int(min(coords, default=default) // 2) - 1)
-                dim_range.min = dimension
+                lowest = coords.min() if len(coords) > 0 else default
+                dim_range.min = 2 * (int(lowest // 2) - 1)
 
             if dim_range.max is None:
                 # Smallest even number strictly greater than the maximum coordinate of any node
-                dimension = 2 * (int(max(coords, default=default) // 2) + 1)
-                dim_range.max = dimension
+                highest = coords.max() if len(coords) > 0 else default
+                dim_range.max = 2 * (int(highest // 2) + 1)
 
         # Arbitrary default values. These are only used if there are no nodes.
-        compute_dimension_bounds(self.header.chart.width, Node.x_coord, 0)
-        compute_dimension_bounds(self.header.chart.height, Node.y_coord, 0)
+        compute_dimension_bounds(self.header.chart.width, x_coords, 0)
+        compute_dimension_bounds(self.header.chart.height, y_coords, 0)
 
         # Make sure that the min and max values are even numbers
         self.header.chart.width.make_even()
@@ -85,13 +186,16 @@ class Chart(pydantic.BaseModel):
         """Remove all nodes and edges that are not within bounds."""
 
         # Remove nodes that are not in the chart
-        trimmed_nodes = {}
-        for node_id, node in self.nodes.items():
-            x_in_bounds = node.x_coord() in self.header.chart.width
-            y_in_bounds = node.y_coord() in self.header.chart.height
-            if x_in_bounds and y_in_bounds:
-                trimmed_nodes[node_id] = node
-        self.nodes = trimmed_nodes
+        x_coords, y_coords = node_coordinates(self.nodes.values())
+        in_bounds = range_mask(x_coords, self.header.chart.width) & range_mask(
+            y_coords, self.header.chart.height
+        )
+        if not in_bounds.all():
+            self.nodes = {
+                node_id: node
+                for (node_id, node), keep in zip(self.nodes.items(), in_bounds.tolist())
+                if keep
+            }
 
         trimmed_edges = []
         for edge in self.edges:
@@ -109,31 +213,46 @@ class Chart(pydantic.BaseModel):
         This computes the values of the `absoluteX` and `absoluteY` properties of all nodes in
         `self.nodes`. Those values will be used by the SVG generation code to place the nodes at the
         correct positions and to draw the edges.
+
+        Nodes that share a bidegree are spread out along a line through it, ordered by their
+        `position` attribute. This is done with array operations over all the nodes at once.
         """
 
-        nodes_by_bidegree = defaultdict(list)
-        nodes_off_grid: List[Node] = []
-
-        # Group nodes by bidegree
-        for node_id, node in self.nodes.items():
-            x, y = node.x, node.y
-            if x is not None and y is not None:
-                nodes_by_bidegree[x, y].append(node_id)
-            else:
-                nodes_off_grid.append(node)
+        nodes = list(self.nodes.values())
+        x = np.array([node.x for node in nodes], dtype=float)
+        y = np.array([node.y for node in nodes], dtype=float)
+        on_grid = ~np.isnan(x) & ~np.isnan(y)
 
         # Deal with nodes that are off grid first
-        for node in nodes_off_grid:
-            if node.absoluteX is None:
-                node.absoluteX = node.x
-            if node.absoluteY is None:
-                node.absoluteY = node.y
-
-        # Sort bidegrees by the `position` attribute of the nodes
-        for bidegree, nodes in nodes_by_bidegree.items():
-            nodes_by_bidegree[bidegree] = sorted(
-                nodes, key=lambda node_id: self.nodes[node_id].position
-            )
+        if not on_grid.all():
+            for index in np.flatnonzero(~on_grid).tolist():
+                node = nodes[index]
+                if node.absoluteX is None:
+                    node.absoluteX = node.x
+                if node.absoluteY is None:
+                    node.absoluteY = node.y
+            nodes = [node for node, keep in zip(nodes, on_grid.tolist()) if keep]
+            x = x[on_grid]
+            y = y[on_grid]
+        if not nodes:
+            return
+        position = np.array([node.position for node in nodes], dtype=np.int64)
+
+        # Sort the nodes by bidegree, then by `position` within each bidegree. Nodes with the same
+        # position stay in the order in which they were given.
+        order = stable_order(x, y, position)
+        x = x[order]
+        y = y[order]
+
+        # Find the rank of each node within its bidegree, and the number of nodes in the bidegree
+        new_bidegree = np.empty(len(x), dtype=bool)
+        new_bidegree[0] = True
+        new_bidegree[1:] = (x[1:] != x[:-1]) | (y[1:] != y[:-1])
+        group_starts = np.flatnonzero(new_bidegree)
+        group_sizes = np.diff(np.append(group_starts, len(x)))
+        group = np.cumsum(new_bidegree) - 1
+        rank = np.arange(len(x)) - group_starts[group]
+        bidegree_rank = group_sizes[group]
 
         # Get defaults and compute constants
         chart_data = self.header.chart
@@ -151,13 +270,19 @@ class Chart(pydantic.BaseModel):
             theta = math.pi / 2
 
         # Calculate absolute positions
-        for (x, y), nodes in nodes_by_bidegree.items():
-            bidegree_rank = len(nodes)
-            first_center_to_last_center = (bidegree_rank - 1) * distance_between_centers
-            for i, node_id in enumerate(nodes):
-                offset = -first_center_to_last_center / 2 + i * distance_between_centers
-                self.nodes[node_id].absoluteX = x + offset * math.cos(theta)
-                self.nodes[node_id].absoluteY = y + offset * math.sin(theta)
+        first_center_to_last_center = (bidegree_rank - 1) * distance_between_centers
+        offset = -first_center_to_last_center / 2 + rank * distance_between_centers
+        # Undo the sort, so that we can assign the positions in the order of the nodes
+        absolute_x = np.empty(len(x))
+        absolute_y = np.empty(len(y))
+        absolute_x[order] = x + offset * math.cos(theta)
+        absolute_y[order] = y + offset * math.sin(theta)
+
+        for node, node_x, node_y in zip(
+            nodes, absolute_x.tolist(), absolute_y.tolist()
+        ):
+            node.absoluteX = node_x
+            node.absoluteY = node_y
 
     def add_nodes_to_edges(self):
         """
@@ -178,15 +303,115 @@ class Chart(pydantic.BaseModel):
                 edge._concrete_target = self.nodes[edge.target]
 
     def prepare(self):
+        if self._is_prepared:
+            return
         # Trim contents to fit within the chart dimensions
-        self.trim_contents()
+        with phase("trim"):
+            self.trim_contents()
         # Normalize chart dimensions. We do this after trimming because otherwise we might include
         # too many nodes in the computation.
-        self.normalize_chart_dimensions()
+        with phase("normalize"):
+            self.normalize_chart_dimensions()
         # First make sure that the absolute positions are calculated
-        self.calculate_absolute_positions()
+        with phase("layout"):
+            self.calculate_absolute_positions()
         # Then add the node objects to the edges
-        self.add_nodes_to_edges()
+        with phase("connect edges"):
+            self.add_nodes_to_edges()
+        self._is_prepared = True
+
+    def edges_svg(self) -> Iterable[str]:
+        """Return the SVG elements of the edges, using the pre-rendered ones if available."""
+        if self._edges_svg is not None:
+            return self._edges_svg
+        scale = self.header.chart.scale
+        return (edge.svg(scale) for edge in self.edges)
+
+    def nodes_svg(self) -> Iterable[str]:
+        """Return the SVG elements of the nodes, using the pre-rendered ones if available."""
+        if self._nodes_svg is not None:
+            return self._nodes_svg
+        scale = self.header.chart.scale
+        return (node.svg(scale) for node in self.nodes.values())
+
+    def content_tile_size(self, tile_size: Optional[float]) -> Optional[float]:
+        """
+        Return the size of the tiles that the contents of the chart are written as, given the tile
+        size of the output mode, or `None` if they are written as SVG elements. Charts drawn on a
+        canvas are always written as tiles.
+        """
+        if tile_size is None and self.header.chart.renderer == "canvas":
+            return default_tile_size
+        return tile_size
+
+    def tiles_payload(self, tile_size: float) -> str:
+        """
+        Return the contents of the chart as tiles of `tile_size` units, for the tiled output mode.
+        This uses the pre-rendered tiles if available.
+        """
+        if self._tiles_payload is not None:
+            return self._tiles_payload
+        self.prepare()
+        return tiles_payload(
+            list(self.nodes.values()), self.edges, self.header.chart.scale, tile_size
+        )
+
+    def render_svg(
+        self, tile_size: Optional[float] = None, elements: bool = True
+    ) -> None:
+        """
+        Pre-render the SVG elements of the chart contents, or its tiles if `tile_size` is given.
+        This is used to do the expensive part of the rendering in a worker process. If `elements`
+        is false, the SVG elements are not needed and the chart is only prepared.
+        """
+        tile_size = self.content_tile_size(tile_size)
+        with phase("prepare"):
+            self.prepare()
+        with phase("svg"):
+            if tile_size is None:
+                if not elements:
+                    return
+                self._edges_svg = list(self.edges_svg())
+                self._nodes_svg = list(self.nodes_svg())
+            else:
+                self._tiles_payload = self.tiles_payload(tile_size)
+
+
+def chart_path(chart_ref: str, input_file: Optional[str]) -> Path:
+    """Return the path of a chart file referenced by a collection, relative to `input_file`."""
+    assert input_file is not None, "Cannot load chart from file without input file"
+    return Path(input_file).parent / chart_ref
+
+
+def load_chart(
+    chart: Union[Chart, str], input_file: Optional[str], trust_input: bool = False
+) -> Chart:
+    """Resolve a chart reference, loading it from a file relative to `input_file` if needed."""
+    if isinstance(chart, str):
+        # This is a reference to another chart
+        with phase("parse"):
+            chart_spec = load_json(chart_path(chart, input_file))
+        with phase("build"):
+            return Chart.model_validate(chart_spec, context={"trusted": trust_input})
+    else:
+        # This is a Chart object
+        return chart
+
+
+def load_and_render_chart(
+    chart: Union[Chart, str],
+    input_file: Optional[str],
+    trust_input: bool = False,
+    tile_size: Optional[float] = None,
+    elements: bool = True,
+) -> Chart:
+    """
+    Load, prepare and pre-render a single chart. This runs in worker processes. `elements` is false
+    if the chart is written as deltas, which don't use the SVG elements.
+    """
+    chart = load_chart(chart, input_file, trust_input)
+    chart.render_svg(tile_size, elements=elements)
+    return chart
 
 
 class Collection(pydantic.BaseModel):
@@ -197,98 +422,288 @@ class Collection(pydantic.BaseModel):
     model_config = pydantic.ConfigDict(extra="allow")
     _input_file: Optional[str] = None
     _is_collection: Optional[bool] = None
-
-    def __init__(self, spec, input_file=None):
-        from jsonschema import RefResolver
-
-        # Create a resolver rooted at the full schema
-        resolver = RefResolver.from_schema(schema)
-
-        def matches_ref(ref):
-            ref_schema = {"$ref": ref}
-            validator = jsonschema.Draft7Validator(schema=ref_schema, resolver=resolver)
-            return validator.is_valid(spec)
-
-        if matches_ref("#/$defs/collection_spec"):
+    _tile_size: Optional[float] = None
+    _lazy_charts: bool = False
+    _delta_charts: bool = False
+
+    def __init__(
+        self,
+        spec,
+        input_file=None,
+        jobs=1,
+        trust_input=False,
+        tile_size=None,
+        lazy_charts=False,
+        delta_charts=False,
+        chart_cache=None,
+    ):
+        if trust_input:
+            # Let pydantic do the structural checks on its own
+            is_collection = isinstance(spec, dict) and "charts" in spec
+        else:
+            with phase("validate"):
+                validate_spec(spec)
+                is_collection = schema_validator("collection_spec").is_valid(spec)
+
+        # The spec is validated at this point (or trusted), including any inline chart, so there's
+        # no need to validate the charts again when building them
+        context = {"trusted": True}
+        if is_collection:
             spec = dict(spec)  # make a shallow copy
             # Extract the raw charts and store as chart_refs
             raw_chart_refs = spec.pop("charts", [])
             spec["chart_refs"] = raw_chart_refs
 
-            super().__init__(**spec)
+            with phase("build"):
+                self.__pydantic_validator__.validate_python(
+                    spec, self_instance=self, context=context
+                )
             self._is_collection = True
-        elif matches_ref("#/$defs/chart_spec"):
+        else:
             # This is a single chart, so we need to wrap it in a collection
-            super().__init__(chart_refs=[Chart(**spec)])
+            with phase("build"):
+                chart = Chart.model_validate(spec, context=context)
+                super().__init__(chart_refs=[chart])
             self._is_collection = False
-        else:
-            # Impossible due to schema
-            raise NotImplementedError
 
         self._input_file = input_file
-
-        self._load_charts()
+        # If set, the contents of the charts are written as tiles of that size instead of SVG
+        self._tile_size = tile_size
+        # If set, the charts are stored compressed and only built when they are shown
+        self._lazy_charts = lazy_charts
+        # If set, the SVG charts of a collection are written as the differences with the previous
+        # chart, and the page builds their elements
+        self._delta_charts = delta_charts
+
+        with phase("load charts"):
+            self._load_charts(jobs, trust_input, chart_cache)
         self._sort_charts()
 
     def __iter__(self):
         return self.charts.__iter__()
 
-    def _load_charts(self) -> None:
-        """Replace all internal chart references with the actual chart objects."""
+    def _load_charts(
+        self, jobs: int = 1, trust_input: bool = False, chart_cache=None
+    ) -> None:
+        """
+        Replace all internal chart references with the actual chart objects.
+
+        If `jobs` is greater than one, the charts are loaded, validated and prepared in parallel by
+        a pool of that many worker processes, which also build the tiles or the SVG elements of the
+        charts. Each chart is handled by a single worker, so there's no point in more workers than
+        charts. If a `ChartCache` is given, the charts are taken from it instead, and only the ones
+        whose files changed are loaded again, on the worker processes as well.
+        """
 
-        expanded_charts = []
-        for chart in self.chart_refs:
-            if isinstance(chart, str):
-                # This is a reference to another chart
-                assert self._input_file is not None, (
-                    "Cannot load chart from file without input file"
+        jobs = min(jobs, len(self.chart_refs))
+        elements = not self.writes_deltas()
+        if chart_cache is not None:
+            self.charts = chart_cache.load_all(
+                self.chart_refs,
+                self._input_file,
+                trust_input,
+                jobs,
+                self._tile_size,
+                elements,
+            )
+        elif jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                self.charts = list(
+                    executor.map(
+                        load_and_render_chart,
+                        self.chart_refs,
+                        [self._input_file] * len(self.chart_refs),
+                        [trust_input] * len(self.chart_refs),
+                        [self._tile_size] * len(self.chart_refs),
+                        [elements] * len(self.chart_refs),
+                    )
                 )
-                chart_path = Path(self._input_file).parent / chart
-                with open(chart_path, "r") as f:
-                    chart_spec = json.load(f)
-                expanded_charts.append(Chart(**chart_spec))
-            else:
-                # This is a Chart object
-                expanded_charts.append(chart)
-        self.charts = expanded_charts
+        else:
+            self.charts = [
+                load_chart(chart, self._input_file, trust_input)
+                for chart in self.chart_refs
+            ]
 
     def _sort_charts(self):
         self.charts.sort(key=lambda chart: chart.header.metadata.id)
 
-    def generate_html(self):
-        for chart in self:
-            chart.prepare()
-
-        template = load_template()
-        return template.render(collection=self)
+    def writes_deltas(self) -> bool:
+        """Return whether the SVG charts are written as deltas instead of SVG elements."""
+        return bool(self._is_collection and self._delta_charts)
 
+    def header_css(self) -> str:
+        """Return the CSS of the header of the collection."""
+        with phase("css"):
+            return self.header.css().generate()
 
-def process_json(input_file, output_file):
-    # Load input JSON
-    with open(input_file, "r") as f:
-        spec = json.load(f)
+    def chart_styles(self) -> List[Tuple[List[int], str]]:
+        """
+        Return the CSS of every chart, as pairs of chart ids and CSS. Charts with the same aliases
+        have the same CSS, so they are grouped together.
+        """
+        styles: Dict[str, List[int]] = {}
+        with phase("css"):
+            for chart in self:
+                chart_css = chart.header.css().generate()
+                styles.setdefault(chart_css, []).append(chart.header.metadata.id)
+        return [(chart_ids, chart_css) for chart_css, chart_ids in styles.items()]
 
-    chart = Collection(spec, input_file=input_file)
+    def generate_html(self) -> str:
+        return "".join(self.generate_html_chunks())
 
-    # Generate HTML
-    html_content = chart.generate_html()
+    def generate_html_chunks(self) -> Iterator[str]:
+        """
+        Render the HTML document piece by piece.
 
-    # Write to output file
-    with open(output_file, "w") as f:
-        f.write(html_content)
+        The chunks are produced as the template is evaluated, so the SVG elements of each chart can
+        be written out as soon as they are generated, without ever holding the whole document in
+        memory.
+        """
+        with phase("prepare"):
+            for chart in self:
+                chart.prepare()
+
+        with phase("compile template"):
+            template = load_template()
+        chart_deltas = ChartDeltas() if self.writes_deltas() else None
+        return template.generate(collection=self, chart_deltas=chart_deltas)
+
+
+def process_json(
+    input_file,
+    output_file,
+    jobs=1,
+    trust_input=False,
+    tile_size=None,
+    lazy_charts=False,
+    delta_charts=False,
+):
+    # Load input JSON
+    with phase("parse"):
+        spec = load_json(input_file)
+
+    with phase("collection"):
+        chart = Collection(
+            spec,
+            input_file=input_file,
+            jobs=jobs,
+            trust_input=trust_input,
+            tile_size=tile_size,
+            lazy_charts=lazy_charts,
+            delta_charts=delta_charts,
+        )
+
+    with phase("render"):
+        write_output(chart.generate_html_chunks(), output_file)
 
     print(f"Generated {output_file} successfully.")
 
 
-def main():
-    if len(sys.argv) != 3:
-        print("Usage: seqsee <input.json> <output.html>")
-        sys.exit(1)
+def write_output(chunks: Iterable[str], output_file) -> None:
+    """
+    Write the HTML to a temporary file as it is generated, and move it in place at the end, so that
+    a failure halfway through doesn't leave a truncated output behind.
+    """
+    partial_file = f"{output_file}.partial"
+    try:
+        with open(partial_file, "w") as f:
+            f.writelines(chunks)
+    except BaseException:
+        # Don't leave the truncated output next to the real one
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(partial_file)
+        raise
+    os.replace(partial_file, output_file)
 
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
 
-    process_json(input_file, output_file)
+def main():
+    parser = argparse.ArgumentParser(
+        prog="seqsee", description="Generate an HTML chart from a SeqSee JSON file."
+    )
+    parser.add_argument("input_file", metavar="input.json")
+    parser.add_argument("output_file", metavar="output.html")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes used to load, prepare and render the charts of a "
+        "collection",
+    )
+    parser.add_argument(
+        "--trust-input",
+        action="store_true",
+        help="skip JSON schema validation and rely on the structural checks of the data model",
+    )
+    parser.add_argument(
+        "--tiles",
+        action="store_true",
+        help="write the nodes and edges as square tiles, which the page only draws when they come "
+        "into view. This keeps very large charts responsive",
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=default_tile_size,
+        metavar="SIZE",
+        help="width and height of the tiles, in chart units (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--lazy-charts",
+        action="store_true",
+        help="store the charts of a collection compressed, and only build the chart that is shown. "
+        "This makes large collections load faster and use less memory",
+    )
+    parser.add_argument(
+        "--delta-charts",
+        action="store_true",
+        help="store each chart of a collection as the differences with the previous one, and "
+        "build its SVG elements on the page when it is shown. This makes collections of many "
+        "pages a lot smaller, but the page needs JavaScript to show the nodes and edges",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running and rebuild the output whenever the input or the chart files it "
+        "references change. The output is also served on a local web server, and the page "
+        "reloads itself after every rebuild",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="port of the local web server of --watch (default: %(default)s)",
+    )
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+
+    if args.watch:
+        # Imported here since the watch mode itself builds on this module
+        from seqsee.serve import watch
+
+        with profiling(args):
+            watch(
+                args.input_file,
+                args.output_file,
+                port=args.port,
+                jobs=args.jobs,
+                trust_input=args.trust_input,
+                tile_size=args.tile_size if args.tiles else None,
+                lazy_charts=args.lazy_charts,
+                delta_charts=args.delta_charts,
+            )
+        return
+
+    with profiling(args):
+        process_json(
+            args.input_file,
+            args.output_file,
+            jobs=args.jobs,
+            trust_input=args.trust_input,
+            tile_size=args.tile_size if args.tiles else None,
+            lazy_charts=args.lazy_charts,
+            delta_charts=args.delta_charts,
+        )
 
 
 if __name__ == "__main__":
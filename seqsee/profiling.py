@@ -0,0 +1,194 @@
+import argparse
+import contextlib
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Optional
+
+
+class PhaseStats:
+    """Accumulated measurements of every run of a phase with a given path."""
+
+    def __init__(self, calls=0, seconds=0.0, allocated=0, peak=0):
+        self.calls = calls
+        self.seconds = seconds
+        self.allocated = allocated
+        self.peak = peak
+
+    def merge(self, other: "PhaseStats") -> None:
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.allocated += other.allocated
+        self.peak = max(self.peak, other.peak)
+
+
+class _Frame:
+    def __init__(self, path: str, start: float, start_memory: int):
+        self.path = path
+        self.start = start
+        self.start_memory = start_memory
+        self.peak = start_memory
+
+
+class Profiler:
+    """
+    Record the wall time and memory allocations of the phases of a run.
+
+    Phases are delimited with the `phase` context manager and can be nested, in which case their
+    paths are joined with slashes (e.g. `render/css`). Phases that run several times, such as the
+    preparation of each chart of a collection, are accumulated together. Allocations are only
+    tracked if `tracemalloc` is tracing. When the profiler is disabled, phases cost next to nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats: Dict[str, PhaseStats] = {}
+        self._stack: List[_Frame] = []
+
+    def _memory(self) -> tuple[int, int]:
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()
+        return (0, 0)
+
+    def _update_peaks(self) -> int:
+        # Fold the peak since the last reset into every open phase, then start measuring afresh
+        current, peak = self._memory()
+        for frame in self._stack:
+            frame.peak = max(frame.peak, peak)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        return current
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        path = f"{self._stack[-1].path}/{name}" if self._stack else name
+        # Register the phase right away, so that phases are listed in the order they started
+        self.stats.setdefault(path, PhaseStats())
+        frame = _Frame(path, time.perf_counter(), self._update_peaks())
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            end_memory = self._update_peaks()
+            self._stack.pop()
+            self.record(
+                path,
+                PhaseStats(
+                    calls=1,
+                    seconds=time.perf_counter() - frame.start,
+                    allocated=end_memory - frame.start_memory,
+                    peak=frame.peak - frame.start_memory,
+                ),
+            )
+
+    def record(self, path: str, stats: PhaseStats) -> None:
+        self.stats.setdefault(path, PhaseStats()).merge(stats)
+
+    def merge_report(self, report: dict, prefix: Optional[str] = None) -> None:
+        """Merge a report produced by another profiler, e.g. in a worker process."""
+        for entry in report["phases"]:
+            path = f"{prefix}/{entry['phase']}" if prefix else entry["phase"]
+            self.record(
+                path,
+                PhaseStats(
+                    entry["calls"],
+                    entry["seconds"],
+                    entry["allocated_bytes"],
+                    entry["peak_bytes"],
+                ),
+            )
+
+    def report(self) -> dict:
+        """Return the measurements as a JSON-serializable dict."""
+        return {
+            "phases": [
+                {
+                    "phase": path,
+                    "calls": stats.calls,
+                    "seconds": stats.seconds,
+                    "allocated_bytes": stats.allocated,
+                    "peak_bytes": stats.peak,
+                }
+                for path, stats in self.stats.items()
+            ]
+        }
+
+    def format_report(self) -> str:
+        """Return the measurements as a human-readable table."""
+
+        def mebibytes(size: int) -> str:
+            return f"{size / 2**20:10.1f}"
+
+        lines = [
+            f"{'phase':<40} {'calls':>6} {'time (s)':>10} {'net (MiB)':>10} {'peak (MiB)':>10}"
+        ]
+        for path, stats in self.stats.items():
+            *parents, name = path.split("/")
+            label = "  " * len(parents) + name
+            lines.append(
+                f"{label:<40} {stats.calls:>6} {stats.seconds:>10.3f}"
+                f" {mebibytes(stats.allocated)} {mebibytes(stats.peak)}"
+            )
+        return "\n".join(lines)
+
+
+profiler = Profiler()
+phase = profiler.phase
+
+
+def add_profiling_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("profiling")
+    group.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the time and memory allocated in each phase to stderr. Tracking allocations "
+        "slows the run down, so compare timings between profiled runs only",
+    )
+    group.add_argument(
+        "--profile-json",
+        metavar="FILE",
+        help="also write the per-phase report to FILE as JSON (implies --profile)",
+    )
+    group.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        help="dump cProfile statistics of the whole run to FILE, for use with pstats or snakeviz",
+    )
+    group.add_argument(
+        "--tracemalloc",
+        metavar="FILE",
+        help="dump a tracemalloc snapshot taken at the end of the run to FILE",
+    )
+
+
+@contextlib.contextmanager
+def profiling(args: argparse.Namespace) -> Iterator[None]:
+    """Profile the enclosed code according to the options of `add_profiling_arguments`."""
+    profiler.enabled = args.profile or args.profile_json is not None
+    if profiler.enabled or args.tracemalloc:
+        tracemalloc.start()
+    cprofile = cProfile.Profile() if args.cprofile else None
+
+    try:
+        with contextlib.ExitStack() as stack:
+            if cprofile is not None:
+                stack.enter_context(cprofile)
+            yield
+    finally:
+        if args.tracemalloc:
+            tracemalloc.take_snapshot().dump(args.tracemalloc)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if cprofile is not None:
+            cprofile.dump_stats(args.cprofile)
+        if profiler.enabled:
+            print(profiler.format_report(), file=sys.stderr)
+            if args.profile_json is not None:
+                with open(args.profile_json, "w") as f:
+                    json.dump(profiler.report(), f, indent=2)
@@ -0,0 +1,55 @@
+import functools
+import json
+from importlib.resources import files
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import jsonschema
+
+schema_uri = "urn:seqsee:input-schema"
+
+
+@functools.cache
+def load_schema() -> dict:
+    with (files("seqsee") / "input_schema.json").open("r") as f:
+        return json.load(f)
+
+
+@functools.cache
+def schema_validator(definition: Optional[str] = None) -> "jsonschema.Draft7Validator":
+    """
+    Return a validator for the input schema, or for one of its definitions (e.g. `"chart_spec"`).
+
+    Building a validator is expensive compared to using it, so each one is compiled once per process
+    and reused afterwards.
+    """
+    # Importing jsonschema takes about a third of the startup time of `seqsee`, so it is only
+    # imported when something is validated
+    import jsonschema
+    import referencing
+    import referencing.jsonschema
+
+    schema = load_schema()
+    jsonschema.Draft7Validator.check_schema(schema)
+    if definition is None:
+        return jsonschema.Draft7Validator(schema)
+
+    resource = referencing.jsonschema.DRAFT7.create_resource(schema)
+    registry = referencing.Registry().with_resource(schema_uri, resource)
+    return jsonschema.Draft7Validator(
+        {"$ref": f"{schema_uri}#/$defs/{definition}"}, registry=registry
+    )
+
+
+def validate_spec(spec, definition: Optional[str] = None) -> None:
+    """
+    Validate a spec against the input schema, or one of its definitions. This behaves like
+    `jsonschema.validate`, raising the most relevant `ValidationError` if the spec is invalid.
+    """
+    import jsonschema
+
+    error = jsonschema.exceptions.best_match(
+        schema_validator(definition).iter_errors(spec)
+    )
+    if error is not None:
+        raise error
@@ -0,0 +1,286 @@
+import http.server
+import itertools
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+from seqsee.chart_internals import compact_interned_attributes
+from seqsee.decoding import load_json
+from seqsee.main import (
+    Chart,
+    Collection,
+    chart_path,
+    load_and_render_chart,
+    load_chart,
+    write_output,
+)
+from seqsee.profiling import phase
+
+# Modification time and size of a file, or `None` if it doesn't exist
+FileStamp = Optional[Tuple[int, int]]
+
+# Script added to the served page, which reloads it whenever the output is rebuilt. The position in
+# the chart is kept in the hash of the URL, so it survives the reload.
+reload_script = """<script>
+  new EventSource("/events").onmessage = (event) => {
+    if (event.data !== "%d") {
+      location.reload();
+    }
+  };
+</script>
+"""
+
+# Seconds between two updates of the event stream when nothing changes, so that closed pages are
+# noticed
+keepalive_interval = 15
+
+
+def file_stamp(path) -> FileStamp:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class ChartCache:
+    """
+    Prepared charts, by the path of the file they were loaded from. A chart file is only loaded,
+    validated and prepared again once its modification time or size changes.
+
+    `used` records the files loaded since it was last cleared, with their stamps at the time.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[FileStamp, Chart]] = {}
+        self.used: Dict[str, FileStamp] = {}
+
+    def load(
+        self, chart: Union[Chart, str], input_file: Optional[str], trust_input: bool
+    ) -> Chart:
+        if not isinstance(chart, str):
+            return chart
+        path = str(chart_path(chart, input_file))
+        # Take the stamp before reading the file, so that a change made while we load it is picked
+        # up by the next check
+        stamp = self.used[path] = file_stamp(path)
+        entry = self.entries.get(path)
+        if entry is None or entry[0] != stamp:
+            loaded = load_chart(chart, input_file, trust_input)
+            with phase("prepare"):
+                loaded.prepare()
+            entry = self.entries[path] = (stamp, loaded)
+        return entry[1]
+
+    def load_all(
+        self,
+        charts: List[Union[Chart, str]],
+        input_file: Optional[str],
+        trust_input: bool,
+        jobs: int = 1,
+        tile_size: Optional[float] = None,
+        elements: bool = True,
+    ) -> List[Chart]:
+        """
+        Resolve the charts of a collection with `load`. If `jobs` is greater than one, the charts
+        that have to be loaded again are loaded and prepared by a pool of that many worker
+        processes, which also build their tiles if `tile_size` is given, or their SVG elements if
+        `elements` is set.
+        """
+        stale: Dict[str, Tuple[FileStamp, str]] = {}
+        for chart in charts:
+            if not isinstance(chart, str):
+                continue
+            path = str(chart_path(chart, input_file))
+            stamp = self.used[path] = file_stamp(path)
+            entry = self.entries.get(path)
+            if entry is None or entry[0] != stamp:
+                stale[path] = (stamp, chart)
+
+        jobs = min(jobs, len(stale))
+        if jobs > 1:
+            refs = [chart for _, chart in stale.values()]
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                loaded = executor.map(
+                    load_and_render_chart,
+                    refs,
+                    [input_file] * len(refs),
+                    [trust_input] * len(refs),
+                    [tile_size] * len(refs),
+                    [elements] * len(refs),
+                )
+                for (path, (stamp, _)), chart in zip(stale.items(), loaded):
+                    self.entries[path] = (stamp, chart)
+
+        return [self.load(chart, input_file, trust_input) for chart in charts]
+
+    def prune(self) -> None:
+        """
+        Forget the charts that were not used since `used` was last cleared, and the attribute lists
+        that only they used.
+        """
+        self.entries = {
+            path: entry for path, entry in self.entries.items() if path in self.used
+        }
+        compact_interned_attributes(
+            element
+            for _, chart in self.entries.values()
+            for element in itertools.chain(chart.nodes.values(), chart.edges)
+        )
+
+
+class LiveBuild:
+    """
+    The output of an input file, kept up to date as the input and the chart files it references
+    change. The charts and the compiled template stay in memory between builds.
+    """
+
+    def __init__(self, input_file: str, output_file: str, **options):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.options = options
+        self.cache = ChartCache()
+        self.stamps: Dict[str, FileStamp] = {}
+        self.html = b""
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def is_stale(self) -> bool:
+        return not self.stamps or any(
+            file_stamp(path) != stamp for path, stamp in self.stamps.items()
+        )
+
+    def rebuild(self) -> None:
+        stamps = {self.input_file: file_stamp(self.input_file)}
+        self.cache.used = {}
+        try:
+            with phase("parse"):
+                spec = load_json(self.input_file)
+            with phase("collection"):
+                collection = Collection(
+                    spec,
+                    input_file=self.input_file,
+                    chart_cache=self.cache,
+                    **self.options,
+                )
+            with phase("render"):
+                html = collection.generate_html()
+            write_output([html], self.output_file)
+        finally:
+            # Even if the build failed, wait for one of its inputs to change before trying again
+            self.stamps = {**stamps, **self.cache.used}
+        self.cache.prune()
+
+        with self.changed:
+            self.html = html.encode()
+            self.version += 1
+            self.changed.notify_all()
+
+    def update(self) -> None:
+        """Rebuild the output, and report how it went instead of raising."""
+        start = time.perf_counter()
+        try:
+            self.rebuild()
+        except Exception:
+            traceback.print_exc()
+            print("Build failed, waiting for the input to change.", flush=True)
+            return
+        elapsed = time.perf_counter() - start
+        print(f"Generated {self.output_file} in {elapsed:.2f}s.", flush=True)
+
+
+class LiveReloadHandler(http.server.BaseHTTPRequestHandler):
+    """Serve the latest output of a `LiveBuild`, and notify open pages of new versions."""
+
+    server: "LiveReloadServer"
+
+    def do_GET(self) -> None:
+        path = self.path.split("?")[0]
+        if path in ("/", "/index.html"):
+            self.send_page()
+        elif path == "/events":
+            self.send_events()
+        else:
+            self.send_error(404)
+
+    def send_page(self) -> None:
+        build = self.server.build
+        with build.changed:
+            html, version = build.html, build.version
+        script = (reload_script % version).encode()
+        body = html.replace(b"</body>", script + b"</body>", 1)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_events(self) -> None:
+        build = self.server.build
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        version = None
+        while True:
+            with build.changed:
+                build.changed.wait_for(
+                    lambda: build.version != version, timeout=keepalive_interval
+                )
+                version = build.version
+            try:
+                self.wfile.write(f"data: {version}\n\n".encode())
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+    def log_message(self, format, *args) -> None:
+        # Every reload would be logged otherwise
+        pass
+
+
+class LiveReloadServer(http.server.ThreadingHTTPServer):
+    # Don't wait for the event streams of open pages when shutting down
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], build: LiveBuild):
+        super().__init__(address, LiveReloadHandler)
+        self.build = build
+
+
+def watch(
+    input_file: str,
+    output_file: str,
+    port: int = 8000,
+    poll_interval: float = 0.5,
+    **options,
+) -> None:
+    """
+    Build the output, then rebuild it whenever the input or one of its chart files changes, until
+    interrupted. The output is served on `localhost:port`, where the page reloads after each build.
+
+    Changes are detected by polling the modification time and size of the files, which works on
+    every platform and file system.
+    """
+    build = LiveBuild(input_file, output_file, **options)
+    build.update()
+
+    server = LiveReloadServer(("localhost", port), build)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving {output_file} at http://localhost:{port}/", flush=True)
+    print("Watching for changes, press Ctrl+C to stop.", flush=True)
+
+    try:
+        while True:
+            time.sleep(poll_interval)
+            if build.is_stale():
+                build.update()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
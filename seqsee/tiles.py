@@ -0,0 +1,423 @@
+import base64
+import gzip
+import json
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from seqsee.chart_internals import Edge, Node
+from seqsee.css import interned_style_and_classes
+
+# Width and height of a tile, in chart units. A tile of 8x8 units holds a few hundred elements in
+# the densest regions of the machine-generated charts.
+default_tile_size = 8
+
+# Columns of the payload, and whether they hold coordinates, bidegrees or indices. Coordinates are
+# stored as 32-bit floats, bidegrees as the smallest signed integers that fit, and indices as the
+# smallest unsigned integers that fit.
+columns = {
+    "bounds": "coordinates",
+    "counts": "indices",
+    "lineCoords": "coordinates",
+    "lineStyles": "indices",
+    "pathCoords": "coordinates",
+    "pathStyles": "indices",
+    "circleCoords": "coordinates",
+    "circleStyles": "indices",
+    "circleLabels": "indices",
+    "gridCounts": "indices",
+    "gridCircles": "indices",
+    "overviewLineSources": "bidegrees",
+    "overviewLineOffsets": "bidegrees",
+    "overviewLineStyles": "indices",
+    "overviewCircleBidegrees": "bidegrees",
+    "overviewCircleStyles": "indices",
+    "overviewCircleCounts": "indices",
+}
+
+# Names of the typed arrays of the page, by numpy type. The columns are written in little-endian
+# order, and the page reads them with the native byte order of the browser, which is little-endian
+# on every platform that matters.
+array_types = {
+    "float32": "Float32Array",
+    "int8": "Int8Array",
+    "int16": "Int16Array",
+    "int32": "Int32Array",
+    "uint8": "Uint8Array",
+    "uint16": "Uint16Array",
+    "uint32": "Uint32Array",
+}
+
+
+class StyleTable:
+    """
+    The distinct `class` and `style` attributes of the elements of a chart. Tiles refer to them by
+    index, so that they are only written once per chart.
+    """
+
+    def __init__(self):
+        self.entries: List[Tuple[str, str]] = []
+        self._indices: Dict[Tuple[str, int], int] = {}
+
+    def index(self, tag: str, attributes_id: int) -> int:
+        key = (tag, attributes_id)
+        index = self._indices.get(key)
+        if index is None:
+            style, aliases = interned_style_and_classes(attributes_id)
+            if tag == "circle":
+                entry = (f"defaultNode {aliases}", style)
+            elif tag == "line":
+                entry = ("defaultEdge " + aliases, style)
+            else:
+                entry = ("defaultEdge " + aliases, f"fill: none;{style}")
+            index = len(self.entries)
+            self.entries.append(entry)
+            self._indices[key] = index
+        return index
+
+    def aliases(self) -> Dict[str, List[int]]:
+        """
+        Return the indices of the styles that use each attribute alias, so that the page can show
+        or hide all the elements of an alias without looking at the elements themselves.
+        """
+        aliases: Dict[str, List[int]] = {}
+        for index, (class_name, _) in enumerate(self.entries):
+            for alias in class_name.split()[1:]:
+                aliases.setdefault(alias, []).append(index)
+        return aliases
+
+
+class LabelTable:
+    """
+    The distinct labels of the nodes of a chart. Index 0 stands for nodes without a label.
+    """
+
+    def __init__(self):
+        self.entries: List[str] = [""]
+        self._indices: Dict[Optional[str], int] = {None: 0}
+
+    def index(self, label: Optional[str]) -> int:
+        index = self._indices.get(label)
+        if index is None:
+            index = self._indices[label] = len(self.entries)
+            self.entries.append(label)
+        return index
+
+
+class Tile:
+    """
+    The nodes and edges of a square region of a chart. Edges belong to the tile of their source.
+
+    The elements are stored as flat lists, with a fixed number of entries per element: `lines` has
+    `x1, y1, x2, y2` for every straight edge, `paths` has the source, both control points and the
+    target of every curved edge, and `circles` has `cx, cy` for every node. Quadratic curves only
+    have one control point, so their second one is NaN. Coordinates are in pixels, and the styles
+    and labels of the elements are indices into the `StyleTable` and `LabelTable` of the chart.
+    """
+
+    def __init__(self):
+        self.bounds = [math.inf, math.inf, -math.inf, -math.inf]
+        self.lines: List[float] = []
+        self.line_styles: List[int] = []
+        self.paths: List[float] = []
+        self.path_styles: List[int] = []
+        self.circles: List[float] = []
+        self.circle_styles: List[int] = []
+        self.circle_labels: List[int] = []
+
+    def include(self, x: float, y: float, margin: float) -> None:
+        """Grow the bounding box of the tile to contain a disk of radius `margin` around (x, y)."""
+        self.bounds[0] = min(self.bounds[0], x - margin)
+        self.bounds[1] = min(self.bounds[1], y - margin)
+        self.bounds[2] = max(self.bounds[2], x + margin)
+        self.bounds[3] = max(self.bounds[3], y + margin)
+
+
+def chart_tiles(
+    nodes: List[Node], edges: List[Edge], scale: float, tile_size: float
+) -> dict:
+    """
+    Partition the nodes and edges of a prepared chart into square tiles of `tile_size` units.
+
+    Returns a dict with the style and label tables of the chart, and its contents as columns: the
+    bounds and the number of lines, paths and circles of every non-empty tile in order of position,
+    followed by the attributes of the elements of all tiles, one tile after the other.
+
+    It also has a grid of the circles by bidegree, for hit-testing: `grid` is the bidegree of its
+    lower left cell, its width and height in cells, and the size of a cell in pixels. The circles
+    whose centers are closest to the bidegree of a cell are listed in `gridCircles`, one cell after
+    the other, by rows from the lower left, and `gridCounts` has the number of circles of each cell.
+    Finally, the columns starting with `overview` hold the `overview_layer` of the chart.
+    """
+    styles = StyleTable()
+    labels = LabelTable()
+    tiles: Dict[Tuple[int, int], Tile] = {}
+    tile_pixels = tile_size * scale
+    # Leave room for the radius of the nodes and the thickness of the edges. Nothing is ever drawn
+    # that far away from the coordinates of an element.
+    margin = scale
+
+    def tile_at(x: float, y: float) -> Tile:
+        key = (math.floor(x / tile_pixels), math.floor(y / tile_pixels))
+        tile = tiles.get(key)
+        if tile is None:
+            tile = tiles[key] = Tile()
+        return tile
+
+    # The endpoints of every edge, and its style as a straight line
+    edge_ends: List[float] = []
+    edge_styles: List[int] = []
+    for edge in edges:
+        x1, y1, x2, y2 = edge.endpoints(scale)
+        edge_ends += [x1, y1, x2, y2]
+        edge_styles.append(styles.index("line", edge.attributes_id))
+        tile = tile_at(x1, y1)
+        tile.include(x1, y1, margin)
+        tile.include(x2, y2, margin)
+        if len(edge.bezier) > 0:
+            control_points = edge.control_points(scale)
+            for control_x, control_y in control_points:
+                tile.include(control_x, control_y, margin)
+            if len(control_points) == 1:
+                control_points.append((math.nan, math.nan))
+            [(control0_x, control0_y), (control1_x, control1_y)] = control_points
+            tile.paths += [
+                x1,
+                y1,
+                control0_x,
+                control0_y,
+                control1_x,
+                control1_y,
+                x2,
+                y2,
+            ]
+            tile.path_styles.append(styles.index("path", edge.attributes_id))
+        else:
+            tile.lines += [x1, y1, x2, y2]
+            tile.line_styles.append(edge_styles[-1])
+
+    # The tile of every circle and its position in the tile
+    circle_slots: List[Tuple[Tile, int]] = []
+    node_styles: List[int] = []
+    for node in nodes:
+        assert node.absoluteX is not None
+        assert node.absoluteY is not None
+        cx = node.absoluteX * scale
+        cy = node.absoluteY * scale
+        tile = tile_at(cx, cy)
+        tile.include(cx, cy, margin)
+        circle_slots.append((tile, len(tile.circle_styles)))
+        node_styles.append(styles.index("circle", node.attributes_id))
+        tile.circles += [cx, cy]
+        tile.circle_styles.append(node_styles[-1])
+        tile.circle_labels.append(labels.index(node.label))
+
+    ordered_tiles = [tile for _, tile in sorted(tiles.items())]
+
+    def column(field: str) -> List:
+        return [value for tile in ordered_tiles for value in getattr(tile, field)]
+
+    first_circles = {}
+    circle_count = 0
+    for tile in ordered_tiles:
+        first_circles[id(tile)] = circle_count
+        circle_count += len(tile.circle_styles)
+    circle_indices = np.array(
+        [first_circles[id(tile)] + slot for tile, slot in circle_slots], dtype=np.int64
+    )
+    node_x = nearest_bidegrees([node.absoluteX for node in nodes])
+    node_y = nearest_bidegrees([node.absoluteY for node in nodes])
+    grid, grid_counts, grid_circles = bidegree_grid(node_x, node_y, circle_indices)
+    edge_bidegrees = nearest_bidegrees(edge_ends, scale).reshape(-1, 4)
+
+    return {
+        "tileSize": tile_size,
+        "styles": styles.entries,
+        "labels": labels.entries,
+        "aliases": styles.aliases(),
+        "bounds": column("bounds"),
+        "counts": [
+            count
+            for tile in ordered_tiles
+            for count in (
+                len(tile.line_styles),
+                len(tile.path_styles),
+                len(tile.circle_styles),
+            )
+        ],
+        "lineCoords": column("lines"),
+        "lineStyles": column("line_styles"),
+        "pathCoords": column("paths"),
+        "pathStyles": column("path_styles"),
+        "circleCoords": column("circles"),
+        "circleStyles": column("circle_styles"),
+        "circleLabels": column("circle_labels"),
+        "grid": grid + [scale],
+        "gridCounts": grid_counts,
+        "gridCircles": grid_circles,
+        **overview_layer(node_x, node_y, node_styles, edge_bidegrees, edge_styles),
+    }
+
+
+def nearest_bidegrees(coordinates: List[float], scale: float = 1) -> np.ndarray:
+    """Return the integers closest to coordinates in units of `scale`, rounding halves up."""
+    # Halves are rounded like `Math.round` on the page
+    return np.floor(np.array(coordinates) / scale + 0.5).astype(np.int64)
+
+
+def bidegree_grid(
+    x: np.ndarray, y: np.ndarray, circle_indices: np.ndarray
+) -> Tuple[List[int], List[int], List[int]]:
+    """
+    Group the circles of the nodes by the bidegree closest to their centers, as a dense grid over
+    the bidegrees of the chart. Nodes are much smaller than a unit, so the node under a point is
+    always in the cell of the point or one next to it, which makes hit-testing take constant time
+    however large the chart is.
+
+    Returns the bidegree of the lower left cell with the width and height of the grid, the number
+    of circles of every cell, and the list of circles, by cell.
+    """
+    if len(x) == 0:
+        return ([0, 0, 0, 0], [], [])
+    left, bottom = int(x.min()), int(y.min())
+    width, height = int(x.max()) - left + 1, int(y.max()) - bottom + 1
+    cells = (y - bottom) * width + (x - left)
+    order = np.argsort(cells, kind="stable")
+    return (
+        [left, bottom, width, height],
+        np.bincount(cells, minlength=width * height).tolist(),
+        circle_indices[order].tolist(),
+    )
+
+
+def overview_layer(
+    node_x: np.ndarray,
+    node_y: np.ndarray,
+    node_styles: List[int],
+    edge_bidegrees: np.ndarray,
+    edge_styles: List[int],
+) -> dict:
+    """
+    Aggregate the nodes and edges of a chart for views that are zoomed out so far that the nodes of
+    a bidegree blur together. Every bidegree with nodes becomes a single glyph, with the style of
+    its first node and the number of its nodes, and all the edges between two bidegrees become a
+    single straight line between them, with the style of the first one. Edges within a bidegree are
+    left out. The glyphs and lines are grouped by style, so that they can be drawn in batches.
+
+    Lines are written as the bidegree of their source and the offset to their target, which are
+    mostly the same few small vectors and compress well.
+
+    `node_x` and `node_y` are the bidegrees of the nodes, and `edge_bidegrees` has the bidegrees of
+    the source and the target of every edge.
+    """
+    node_bidegrees = np.stack([node_x, node_y], axis=1)
+    glyphs, first_nodes, counts = np.unique(
+        node_bidegrees, axis=0, return_index=True, return_counts=True
+    )
+    glyph_styles = np.array(node_styles, dtype=np.int64)[first_nodes]
+    order = np.argsort(glyph_styles, kind="stable")
+    glyphs, glyph_styles, counts = glyphs[order], glyph_styles[order], counts[order]
+
+    between_bidegrees = np.any(edge_bidegrees[:, :2] != edge_bidegrees[:, 2:], axis=1)
+    bundles, first_edges = np.unique(
+        edge_bidegrees[between_bidegrees], axis=0, return_index=True
+    )
+    bundle_styles = np.array(edge_styles, dtype=np.int64)[between_bidegrees]
+    bundle_styles = bundle_styles[first_edges]
+    order = np.argsort(bundle_styles, kind="stable")
+    bundles, bundle_styles = bundles[order], bundle_styles[order]
+
+    return {
+        "overviewLineSources": bundles[:, :2].ravel().tolist(),
+        "overviewLineOffsets": (bundles[:, 2:] - bundles[:, :2]).ravel().tolist(),
+        "overviewLineStyles": bundle_styles.tolist(),
+        "overviewCircleBidegrees": glyphs.ravel().tolist(),
+        "overviewCircleStyles": glyph_styles.tolist(),
+        "overviewCircleCounts": counts.tolist(),
+    }
+
+
+def encode_column(values: List, kind: str) -> np.ndarray:
+    """Convert a column of the tiles to the smallest typed array that holds its values."""
+    if kind == "coordinates":
+        return np.asarray(values, dtype="<f4")
+    if kind == "bidegrees":
+        largest = max((abs(value) for value in values), default=0)
+        dtype = "<i1" if largest < 2**7 else "<i2" if largest < 2**15 else "<i4"
+        return np.asarray(values, dtype=dtype)
+    largest = max(values, default=0)
+    dtype = "<u1" if largest < 2**8 else "<u2" if largest < 2**16 else "<u4"
+    return np.asarray(values, dtype=dtype)
+
+
+def group_by_style(
+    arrays: Dict[str, np.ndarray], kind: int, styles: str, attributes: Dict[str, int]
+) -> np.ndarray:
+    """
+    Reorder the elements of one kind within every tile so that elements with the same style are
+    next to each other, which lets the canvas renderer draw them in a single batch. `kind` is the
+    position of the element count in `counts`, and `attributes` gives the number of entries per
+    element of every other column of that kind.
+
+    Returns the new order of the elements, as indices into the previous one.
+    """
+    counts = arrays["counts"].reshape(-1, 3)[:, kind]
+    tile_ids = np.repeat(np.arange(len(counts)), counts)
+    order = np.lexsort((arrays[styles], tile_ids))
+    arrays[styles] = arrays[styles][order]
+    for name, width in attributes.items():
+        arrays[name] = arrays[name].reshape(-1, width)[order].ravel()
+    return order
+
+
+def tiles_payload(
+    nodes: List[Node], edges: List[Edge], scale: float, tile_size: float
+) -> str:
+    """
+    Return the tiles of a chart as a gzipped binary payload, encoded in base64.
+
+    The payload starts with the length of a JSON header, as a little-endian 32-bit integer. The
+    header holds the tile size, the style and label tables, the styles of every alias, the shape of
+    the bidegree grid, and the type, offset and length of each column. The columns follow as typed
+    arrays, each aligned to 4 bytes from the start of the payload so that the page can use them in
+    place.
+    """
+    data = chart_tiles(nodes, edges, scale, tile_size)
+    arrays = {name: encode_column(data[name], kind) for name, kind in columns.items()}
+    group_by_style(arrays, 0, "lineStyles", {"lineCoords": 4})
+    group_by_style(arrays, 1, "pathStyles", {"pathCoords": 8})
+    circle_order = group_by_style(
+        arrays, 2, "circleStyles", {"circleCoords": 2, "circleLabels": 1}
+    )
+    # The grid refers to circles by their position before they were grouped
+    new_positions = np.empty_like(circle_order)
+    new_positions[circle_order] = np.arange(len(circle_order))
+    arrays["gridCircles"] = new_positions[arrays["gridCircles"]].astype(
+        arrays["gridCircles"].dtype
+    )
+
+    header: dict = {
+        "tileSize": data["tileSize"],
+        "styles": data["styles"],
+        "labels": data["labels"],
+        "aliases": data["aliases"],
+        "grid": data["grid"],
+        "columns": {},
+    }
+    offset = 0
+    for name, array in arrays.items():
+        header["columns"][name] = [array_types[array.dtype.name], offset, len(array)]
+        offset += -(-array.nbytes // 4) * 4
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    header_bytes += b" " * (-len(header_bytes) % 4)
+
+    payload = bytearray(len(header_bytes).to_bytes(4, "little"))
+    payload += header_bytes
+    for array in arrays.values():
+        payload += array.tobytes()
+        payload += bytes(-array.nbytes % 4)
+
+    # Fix the timestamp so that the output is reproducible
+    compressed = gzip.compress(payload, compresslevel=6, mtime=0)
+    return base64.b64encode(compressed).decode("ascii")